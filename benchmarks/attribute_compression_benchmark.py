@@ -0,0 +1,73 @@
+"""Size and latency of AttributeCompressor on a large JSON attribute
+
+Sizes are the attribute sizes DynamoDB bills for: reads cost one RCU per
+4KB (strongly consistent), writes one WCU per 1KB.
+
+Run with: python benchmarks/attribute_compression_benchmark.py
+"""
+import json
+import math
+import timeit
+from decimal import Decimal
+
+from fluxo_aws.attribute_compression import AttributeCompressor, zstandard
+
+NUMBER = 200
+
+item = {
+    "id": "order-1",
+    "payload": [
+        {
+            "sku": f"SKU-{x:06d}",
+            "name": f"Product {x % 50}",
+            "price": Decimal(f"{x % 97}.90"),
+            "quantity": x % 7,
+            "tags": ["promo", "catalog"] if x % 3 else ["catalog"],
+        }
+        for x in range(1500)
+    ],
+}
+
+compressors = [
+    ("zlib level 1", AttributeCompressor(["payload"], level=1)),
+    ("zlib level 6", AttributeCompressor(["payload"], level=6)),
+    ("zlib level 9", AttributeCompressor(["payload"], level=9)),
+]
+if zstandard is not None:
+    compressors += [
+        ("zstd level 3", AttributeCompressor(["payload"], algorithm="zstd", level=3)),
+        ("zstd level 9", AttributeCompressor(["payload"], algorithm="zstd", level=9)),
+    ]
+
+
+def size(value):
+    if isinstance(value, (list, dict)):
+        return len(json.dumps(value, default=str).encode())
+    return len(value.value)
+
+
+def run(name, compressor):
+    compressed = compressor.compress_item(item)
+    compress_seconds = timeit.timeit(
+        lambda: compressor.compress_item(item), number=NUMBER
+    )
+    decompress_seconds = timeit.timeit(
+        lambda: compressor.decompress_item(dict(compressed)), number=NUMBER
+    )
+    bytes = size(compressed["payload"])
+    print(
+        f"{name:<16} {bytes:>9} bytes {math.ceil(bytes / 4096):>5} RCU "
+        f"{math.ceil(bytes / 1024):>5} WCU "
+        f"{compress_seconds / NUMBER * 1e3:8.2f} ms compress "
+        f"{decompress_seconds / NUMBER * 1e3:8.2f} ms decompress"
+    )
+
+
+if __name__ == "__main__":
+    bytes = size(item["payload"])
+    print(
+        f"{'uncompressed':<16} {bytes:>9} bytes {math.ceil(bytes / 4096):>5} RCU "
+        f"{math.ceil(bytes / 1024):>5} WCU"
+    )
+    for name, compressor in compressors:
+        run(name, compressor)
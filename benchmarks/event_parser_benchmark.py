@@ -0,0 +1,53 @@
+"""Micro-benchmarks for the event_parser decorator overhead
+
+Run with: python benchmarks/event_parser_benchmark.py
+"""
+import json
+import timeit
+from base64 import b64encode
+
+from fluxo_aws.event_parser import event_parser
+
+NUMBER = 100000
+
+body = json.dumps({"items": [{"id": x, "name": f"item {x}"} for x in range(100)]})
+event = {
+    "headers": {"Authorization": "Bearer token", "Content-Type": "application/json"},
+    "queryStringParameters": {"page": "1"},
+    "pathParameters": {"id": "123"},
+    "body": body,
+}
+base64_event = dict(event, body=b64encode(body.encode()).decode(), isBase64Encoded=True)
+
+
+def handler(event, context):
+    return event
+
+
+@event_parser
+def header_handler(event, context):
+    return event.headers.get("Authorization")
+
+
+@event_parser
+def body_handler(event, context):
+    return event.body.get("items")
+
+
+@event_parser
+def get_handler(event, context):
+    return event.get("id")
+
+
+def run(name, stmt):
+    seconds = timeit.timeit(stmt, number=NUMBER)
+    print(f"{name:<40} {seconds / NUMBER * 1e6:8.2f} us/call")
+
+
+if __name__ == "__main__":
+    run("undecorated call", lambda: handler(event, None))
+    run("decorated, header access", lambda: header_handler(event, None))
+    run("decorated, kwargs event", lambda: header_handler(event=event, context=None))
+    run("decorated, body access", lambda: body_handler(event, None))
+    run("decorated, base64 body access", lambda: body_handler(base64_event, None))
+    run("decorated, get() through all sources", lambda: get_handler(event, None))
@@ -0,0 +1,80 @@
+"""Deserialization cost of scan pages, boto3 TypeDeserializer vs fast_reads
+
+Each scan page holds 1000 typed items, as returned by the low-level client.
+The "+ json" rows include encoding the items for a prepare_response body.
+
+Run with: python benchmarks/fast_deserializer_benchmark.py
+"""
+import json
+import timeit
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from fluxo_aws.fast_deserializer import deserialize_item
+from fluxo_aws.json_encoder import json_encoder
+
+NUMBER = 20
+
+page = [
+    {
+        "id": {"S": f"order-{x}"},
+        "created_at": {"N": str(1600000000 + x)},
+        "total": {"N": f"{x % 1000}.{x % 100:02d}"},
+        "quantity": {"N": str(x % 10)},
+        "status": {"S": "paid" if x % 3 else "pending"},
+        "paid": {"BOOL": bool(x % 3)},
+        "tags": {"SS": ["a", "b"]},
+        "customer": {
+            "M": {
+                "id": {"S": f"customer-{x % 97}"},
+                "score": {"N": f"{x % 5}.5"},
+                "addresses": {
+                    "L": [{"M": {"zip": {"S": "01000-000"}, "number": {"N": "10"}}}]
+                },
+            }
+        },
+        "lines": {
+            "L": [
+                {"M": {"sku": {"S": f"SKU-{y}"}, "price": {"N": f"{y}.99"}}}
+                for y in range(5)
+            ]
+        },
+    }
+    for x in range(1000)
+]
+
+type_deserializer = TypeDeserializer()
+
+
+def boto3_page():
+    return [
+        {k: type_deserializer.deserialize(v) for k, v in item.items()} for item in page
+    ]
+
+
+def decimal_page():
+    return [deserialize_item(item) for item in page]
+
+
+def native_page():
+    return [deserialize_item(item, native_numbers=True) for item in page]
+
+
+def encode(items):
+    for item in items:
+        item.pop("tags")
+    return json.dumps(items, default=json_encoder)
+
+
+def run(name, stmt):
+    seconds = timeit.timeit(stmt, number=NUMBER)
+    print(f"{name:<40} {seconds / NUMBER * 1e3:8.2f} ms/page")
+
+
+if __name__ == "__main__":
+    run("boto3 TypeDeserializer", boto3_page)
+    run("fast_reads, Decimal numbers", decimal_page)
+    run("fast_reads, native numbers", native_page)
+    run("boto3 TypeDeserializer + json", lambda: encode(boto3_page()))
+    run("fast_reads, Decimal numbers + json", lambda: encode(decimal_page()))
+    run("fast_reads, native numbers + json", lambda: encode(native_page()))
@@ -1,5 +1,6 @@
 from .prepare_response import prepare_response  # noqa: F401
 from .event_parser import event_parser  # noqa: F401
+from .event_loop import get_event_loop, run_until_complete  # noqa: F401
 from .dynamodb_table import DynamodbTable, SchemaError  # noqa: F401
 from .auth import (  # noqa: F401
     hash_password,  # noqa: F401
@@ -13,5 +14,19 @@ from .auth import (  # noqa: F401
 from .s3_bucket import S3Bucket  # noqa: F401
 from .async_dynamodb_table import AsyncDynamodbTable  # noqa: F401
 from .async_s3_bucket import AsyncS3Bucket  # noqa: F401
+from .metrics import OperationMetric, EMFMetricsSink  # noqa: F401
+from .rate_limiter import CapacityRateLimiter, TokenBucket  # noqa: F401
+from .retry import RetryPolicy, HedgePolicy  # noqa: F401
+from .table_export import export_table, async_export_table  # noqa: F401
+from .table_import import import_table, async_import_table  # noqa: F401
+from .write_coalescer import (  # noqa: F401
+    AsyncWriteCoalescer,  # noqa: F401
+    UnprocessedWriteError,  # noqa: F401
+)  # noqa: F401
+from .single_flight import SingleFlight, AsyncSingleFlight  # noqa: F401
+from .table_snapshot import TableSnapshot, AsyncTableSnapshot  # noqa: F401
+from .attribute_compression import AttributeCompressor  # noqa: F401
+from .s3_overflow import S3Overflow, AsyncS3Overflow  # noqa: F401
+from .fast_deserializer import deserialize_item  # noqa: F401
 
 __version__ = "0.4.2"
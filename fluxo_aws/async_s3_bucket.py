@@ -1,10 +1,18 @@
+import os
 from botocore.exceptions import ClientError
 import aioboto3
+from .metrics import Instrumentation
+from .s3_bucket import (
+    MULTIPART_MIN_PART_SIZE,
+    MULTIPART_PART_SIZE,
+    READ_CHUNK_SIZE,
+)
 
 
 class AsyncS3Bucket:
-    def __init__(self, bucket_name: str):
+    def __init__(self, bucket_name: str, metrics=None):
         self.bucket_name = bucket_name
+        self.instrumentation = Instrumentation(bucket_name, metrics)
 
     async def __aenter__(self):
         self.s3_client = await aioboto3.client("s3").__aenter__()
@@ -25,9 +33,12 @@ class AsyncS3Bucket:
         if object_name is None:
             object_name = file_name
 
-        await self.s3_client.upload_file(
-            file_name, self.bucket_name, object_name, ExtraArgs=ExtraArgs
-        )
+        with self.instrumentation.record("upload_file") as recorder:
+            await self.s3_client.upload_file(
+                file_name, self.bucket_name, object_name, ExtraArgs=ExtraArgs
+            )
+            if self.instrumentation.enabled:
+                recorder.add(items=1, bytes=os.path.getsize(file_name))
 
         return True
 
@@ -45,9 +56,12 @@ class AsyncS3Bucket:
 
         # Download the file
         try:
-            response = await self.s3_client.download_file(
-                self.bucket_name, object_name, file_name
-            )
+            with self.instrumentation.record("download_file") as recorder:
+                response = await self.s3_client.download_file(
+                    self.bucket_name, object_name, file_name
+                )
+                if self.instrumentation.enabled:
+                    recorder.add(items=1, bytes=os.path.getsize(file_name))
         except ClientError:
             return None
         return response
@@ -64,7 +78,11 @@ class AsyncS3Bucket:
         if file_name is None:
             file_name = object_name
 
-        await self.s3_client.download_fileobj(self.bucket_name, object_name, file_name)
+        with self.instrumentation.record("download_fileobj") as recorder:
+            await self.s3_client.download_fileobj(
+                self.bucket_name, object_name, file_name
+            )
+            recorder.add(items=1)
 
         return True
 
@@ -104,10 +122,43 @@ class AsyncS3Bucket:
         )
         return response
 
+    async def put_object(self, object_name, data, ExtraArgs=None):
+        """Upload bytes as an S3 object
+
+        :param object_name: S3 object name
+        :param data: bytes
+        :return: boto3 response
+        """
+        with self.instrumentation.record("put_object") as recorder:
+            response = await self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=object_name, Body=data, **(ExtraArgs or {})
+            )
+            recorder.add(items=1, bytes=len(data))
+        return response
+
+    async def get_object(self, object_name):
+        """Read a whole S3 object
+
+        :param object_name: S3 object name
+        :return: bytes
+        """
+        with self.instrumentation.record("get_object") as recorder:
+            response = await self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=object_name
+            )
+            recorder.page(response, 1)
+            body = response["Body"]
+            try:
+                return await body.read()
+            finally:
+                body.close()
+
     async def delete_object(self, key, bucket_name=None):
-        response = await self.s3_client.delete_object(
-            Bucket=bucket_name or self.bucket_name, Key=key
-        )
+        with self.instrumentation.record("delete_object") as recorder:
+            response = await self.s3_client.delete_object(
+                Bucket=bucket_name or self.bucket_name, Key=key
+            )
+            recorder.page(response, 1)
         return response
 
     async def list_objects(self, prefix=None, bucket_name=None):
@@ -121,24 +172,135 @@ class AsyncS3Bucket:
         done = False
         continuation_token = None
 
-        while not done:
-            if continuation_token:
-                query_kwargs["ContinuationToken"] = continuation_token
-            response = await self.s3_client.list_objects_v2(**query_kwargs)
-            final_result.extend(response.get("Contents", []))
-            continuation_token = response.get("ContinuationToken", None)
-            done = continuation_token is None
+        with self.instrumentation.record("list_objects") as recorder:
+            while not done:
+                if continuation_token:
+                    query_kwargs["ContinuationToken"] = continuation_token
+                response = await self.s3_client.list_objects_v2(**query_kwargs)
+                recorder.page(response, len(response.get("Contents", [])))
+                final_result.extend(response.get("Contents", []))
+                continuation_token = response.get("ContinuationToken", None)
+                done = continuation_token is None
 
         return final_result
 
     async def move_object(self, source, dest, bucket_name=None):
-        await self.s3_client.copy_object(
-            Bucket=bucket_name or self.bucket_name,
-            CopySource=f"/{bucket_name or self.bucket_name}/{source}",
-            Key=dest,
-        )
+        with self.instrumentation.record("move_object") as recorder:
+            response = await self.s3_client.copy_object(
+                Bucket=bucket_name or self.bucket_name,
+                CopySource=f"/{bucket_name or self.bucket_name}/{source}",
+                Key=dest,
+            )
+            recorder.page(response, 1)
+
+            response = await self.s3_client.delete_object(
+                Bucket=bucket_name or self.bucket_name,
+                Key=source,
+            )
+            recorder.page(response, 0)
+
+    async def upload_stream(
+        self, object_name, chunks, part_size=MULTIPART_PART_SIZE, ExtraArgs=None
+    ):
+        """Upload an async iterable of bytes chunks without holding it all in memory
+
+        Chunks are buffered up to part_size and sent as multipart upload parts,
+        so memory stays bounded by part_size. Streams smaller than one part
+        are sent with a single PutObject. Failed uploads are aborted.
+
+        :param object_name: S3 object name
+        :param chunks: async iterable of bytes
+        :param part_size: multipart part size in bytes, at least 5MB
+        :return: number of bytes uploaded
+        """
+        if part_size < MULTIPART_MIN_PART_SIZE:
+            raise ValueError("part_size must be at least 5MB")
+
+        extra_args = ExtraArgs or {}
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        size = 0
+        with self.instrumentation.record("upload_stream") as recorder:
+            try:
+                async for chunk in chunks:
+                    buffer += chunk
+                    if len(buffer) < part_size:
+                        continue
+                    if upload_id is None:
+                        response = await self.s3_client.create_multipart_upload(
+                            Bucket=self.bucket_name, Key=object_name, **extra_args
+                        )
+                        upload_id = response["UploadId"]
+                    parts.append(
+                        await self._upload_part(
+                            object_name, upload_id, len(parts) + 1, buffer
+                        )
+                    )
+                    size += len(buffer)
+                    buffer = bytearray()
 
-        await self.s3_client.delete_object(
-            Bucket=bucket_name or self.bucket_name,
-            Key=source,
+                size += len(buffer)
+                if upload_id is None:
+                    await self.s3_client.put_object(
+                        Bucket=self.bucket_name,
+                        Key=object_name,
+                        Body=bytes(buffer),
+                        **extra_args,
+                    )
+                else:
+                    if buffer:
+                        parts.append(
+                            await self._upload_part(
+                                object_name, upload_id, len(parts) + 1, buffer
+                            )
+                        )
+                    await self.s3_client.complete_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=object_name,
+                        UploadId=upload_id,
+                        MultipartUpload={"Parts": parts},
+                    )
+            except Exception:
+                if upload_id is not None:
+                    await self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=object_name, UploadId=upload_id
+                    )
+                raise
+            recorder.add(items=1, bytes=size)
+        return size
+
+    async def _upload_part(self, object_name, upload_id, part_number, data):
+        response = await self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=object_name,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=bytes(data),
         )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    async def iter_object(self, object_name, start_byte=0, chunk_size=READ_CHUNK_SIZE):
+        """Stream an object body as bytes chunks, without downloading it to disk
+
+        :param object_name: S3 object name
+        :param start_byte: offset to start reading from
+        :param chunk_size: size of the yielded chunks
+        :return: async generator of bytes
+        """
+        kwargs = {"Bucket": self.bucket_name, "Key": object_name}
+        if start_byte:
+            kwargs["Range"] = f"bytes={start_byte}-"
+
+        with self.instrumentation.record("iter_object") as recorder:
+            response = await self.s3_client.get_object(**kwargs)
+            recorder.page(response, 1)
+            body = response["Body"]
+            try:
+                while True:
+                    chunk = await body.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                body.close()
@@ -0,0 +1,118 @@
+import json
+import zlib
+from decimal import Decimal
+from boto3.dynamodb.types import Binary
+from .json_encoder import json_encoder
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed values start with MAGIC and a byte naming the algorithm
+MAGIC = b"\x00FXC"
+ALGORITHMS = {"zlib": b"z", "zstd": b"s"}
+
+
+def _compression_encoder(obj):
+    if isinstance(obj, Decimal) and obj == obj.to_integral_value():
+        return int(obj)
+    return json_encoder(obj)
+
+
+def _decode(data, native_numbers=False):
+    """Parse JSON with numbers as Decimal, like boto3, or as int/float"""
+    if native_numbers:
+        return json.loads(data)
+    return json.loads(data, parse_float=Decimal, parse_int=Decimal)
+
+
+class AttributeCompressor:
+    """Store large item attributes as compressed Binary values
+
+    Attribute values are JSON encoded and compressed with zlib or zstd
+    (needs the zstandard package). Values only stay compressed when that
+    makes them smaller. Compressed values are recognized on read by their
+    prefix and decoded back, with every number as Decimal, as boto3 does,
+    or as int/float for tables with native_numbers.
+    Compressed attributes can't be used in key conditions or filters.
+
+    :param attributes: attribute names always compressed
+    :param threshold: compress any other attribute whose JSON encoding is at
+        least this many bytes, None to only compress attributes
+    :param algorithm: "zlib" or "zstd"
+    :param level: compression level
+    :param exclude: attribute names never compressed, e.g. GSI keys; the
+        table hash and partition keys are never compressed either
+    """
+
+    def __init__(
+        self, attributes=(), threshold=None, algorithm="zlib", level=6, exclude=()
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("algorithm must be zlib or zstd")
+        if algorithm == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.attributes = set(attributes)
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.level = level
+        self.exclude = set(exclude)
+        self.prefix = MAGIC + ALGORITHMS[algorithm]
+
+    def _compress(self, data):
+        if self.algorithm == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return zlib.compress(data, self.level)
+
+    def compress_value(self, value, force=True):
+        """:return: Binary value, or value itself when compressing doesn't pay"""
+        if not force and self.threshold is None:
+            return value
+        data = json.dumps(value, default=_compression_encoder).encode()
+        if not force and len(data) < self.threshold:
+            return value
+        compressed = self.prefix + self._compress(data)
+        if len(compressed) >= len(data):
+            return value
+        return Binary(compressed)
+
+    def compress_item(self, item, exclude=()):
+        """:return: copy of item, with its large attributes compressed"""
+        result = {}
+        for name, value in item.items():
+            if name in self.exclude or name in exclude or value is None:
+                result[name] = value
+            else:
+                result[name] = self.compress_value(value, name in self.attributes)
+        return result
+
+    @staticmethod
+    def is_compressed(value):
+        if isinstance(value, Binary):
+            value = value.value
+        return isinstance(value, bytes) and value[: len(MAGIC)] == MAGIC
+
+    @staticmethod
+    def decompress_value(value, native_numbers=False):
+        if isinstance(value, Binary):
+            value = value.value
+        algorithm, data = value[len(MAGIC) : len(MAGIC) + 1], value[len(MAGIC) + 1 :]
+        if algorithm == ALGORITHMS["zstd"]:
+            if zstandard is None:
+                raise ValueError("zstd compressed value needs the zstandard package")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = zlib.decompress(data)
+        return _decode(data, native_numbers)
+
+    def decompress_item(self, item, native_numbers=False):
+        """Decompress the compressed attributes of item, in place
+
+        :param native_numbers: numbers as int/float instead of Decimal
+        :return: item
+        """
+        for name, value in item.items():
+            if self.is_compressed(value):
+                item[name] = self.decompress_value(value, native_numbers)
+        return item
@@ -4,7 +4,17 @@ from cerberus import Validator, TypeDefinition
 import json
 from .json_encoder import json_encoder
 from decimal import Decimal
+import time
 import warnings
+from collections import deque
+from .metrics import Instrumentation
+from .table_snapshot import TableSnapshot
+from .fast_deserializer import client_kwargs, deserialize_response
+from .single_flight import SingleFlight, freeze
+from .rate_limiter import limited_call, consumed_capacity_units
+
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
 
 
 class SchemaError(Exception):
@@ -12,7 +22,23 @@ class SchemaError(Exception):
 
 
 class DynamodbTable:
-    def __init__(self, table_name, schema=None, hash_key=None, partition_key=None):
+    def __init__(
+        self,
+        table_name,
+        schema=None,
+        hash_key=None,
+        partition_key=None,
+        metrics=None,
+        return_consumed_capacity=None,
+        rate_limiter=None,
+        retry_policy=None,
+        hedge_policy=None,
+        single_flight=False,
+        compression=None,
+        overflow=None,
+        fast_reads=False,
+        native_numbers=False,
+    ):
         self.table_name = table_name
         self.schema = schema
         self.resource = boto3.resource("dynamodb")
@@ -20,6 +46,22 @@ class DynamodbTable:
         self.table = self.resource.Table(table_name)
         self.hash_key = hash_key
         self.partition_key = partition_key
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        if single_flight is True:
+            single_flight = SingleFlight()
+        self.single_flight = single_flight or None
+        self.compression = compression
+        self.overflow = overflow
+        self.fast_reads = fast_reads
+        # Only the low-level read path can skip Decimal
+        self.native_numbers = fast_reads and native_numbers
+        if rate_limiter and return_consumed_capacity is None:
+            return_consumed_capacity = "TOTAL"
+        self.instrumentation = Instrumentation(
+            table_name, metrics, return_consumed_capacity
+        )
 
         if self.schema:
             self.validator = Validator(schema)
@@ -35,12 +77,80 @@ class DynamodbTable:
         else:
             self.validator = None
 
+    def _call(self, capacity, units, method, kwargs, recorder=None):
+        """Call a table method, paced by the rate limiter if there is one
+
+        :param capacity: "read" or "write"
+        :param units: capacity units expected to be consumed
+        :param recorder: metrics recorder counting the retries
+        """
+        bucket = getattr(self.rate_limiter, capacity, None)
+        kwargs = self.instrumentation.request_kwargs(kwargs)
+        if self.retry_policy is not None:
+            return self.retry_policy.call(method, kwargs, bucket, units, recorder)
+        if bucket is None:
+            return method(**kwargs)
+        return limited_call(bucket, units, method, kwargs, recorder)
+
+    def _reader(self, operation, method=None):
+        """Table read method, or its low-level client version with fast_reads
+
+        :param operation: "query", "scan", "get_item" or "batch_get_item"
+        :param method: method used without fast_reads, defaults to the Table one
+        """
+        if not self.fast_reads:
+            return method or getattr(self.table, operation)
+
+        client_method = getattr(self.client, operation)
+
+        def fast(**kwargs):
+            kwargs = client_kwargs(kwargs)
+            if operation != "batch_get_item":
+                kwargs["TableName"] = self.table_name
+            response = client_method(**kwargs)
+            return deserialize_response(response, self.native_numbers)
+
+        return fast
+
+    def _hedged(self, method):
+        def hedged(**kwargs):
+            return self.hedge_policy.call(method, kwargs)
+
+        return hedged
+
+    def _pages(self, method, kwargs, recorder):
+        """Yield every page of a query or scan, following LastEvaluatedKey"""
+        kwargs = dict(kwargs)
+        key = None
+        units = 1.0
+        while True:
+            if key:
+                kwargs["ExclusiveStartKey"] = key
+
+            response = self._call("read", units, method, kwargs, recorder)
+            # The next page is expected to cost about as much as this one
+            units = consumed_capacity_units(response) or units
+            recorder.page(response)
+            self._load_overflow(self._decompress(response.get("Items", [])))
+            yield response
+            key = response.get("LastEvaluatedKey")
+
+            if not key:
+                break
+
     def exists(self, id, hash_key=None):
         key = hash_key or self.hash_key
         try:
-            if self.table.query(KeyConditionExpression=Key(key).eq(id)).get(
-                "Items", []
-            ):
+            with self.instrumentation.record("exists") as recorder:
+                response = self._call(
+                    "read",
+                    1.0,
+                    self.table.query,
+                    {"KeyConditionExpression": Key(key).eq(id)},
+                    recorder,
+                )
+                recorder.page(response)
+            if response.get("Items", []):
                 return True
             else:
                 return False
@@ -49,29 +159,92 @@ class DynamodbTable:
 
     def get_by_hash_key(self, id, hash_key=None, index_name=None):
         key = hash_key or self.hash_key
+        if self.single_flight is not None:
+            return self.single_flight.do(
+                "get_by_hash_key",
+                freeze((self.table_name, id, key, index_name)),
+                lambda: self._get_by_hash_key(id, key, index_name),
+            )
+        return self._get_by_hash_key(id, key, index_name)
+
+    def _get_by_hash_key(self, id, key, index_name):
         query_kwargs = {"KeyConditionExpression": Key(key).eq(id)}
         if index_name:
             query_kwargs["IndexName"] = index_name
 
         try:
             items = []
-            key = None
-            while True:
-                if key:
-                    query_kwargs["ExclusiveStartKey"] = key
-
-                response = self.table.query(**query_kwargs)
-                items.extend(response.get("Items", []))
-                key = response.get("LastEvaluatedKey")
-
-                if not key:
-                    break
+            with self.instrumentation.record("get_by_hash_key") as recorder:
+                for response in self._pages(
+                    self._reader("query"), query_kwargs, recorder
+                ):
+                    items.extend(response.get("Items", []))
             return items
         except self.client.exceptions.ResourceNotFoundException:
             return []
 
     def get_item(self, data):
-        return self.table.get_item(Key=data).get("Item", {})
+        if self.single_flight is not None:
+            return self.single_flight.do(
+                "get_item",
+                freeze((self.table_name, data)),
+                lambda: self._get_item(data),
+            )
+        return self._get_item(data)
+
+    def _get_item(self, data, resolve=True):
+        kwargs = {"Key": data}
+        method = self._reader("get_item")
+        if self.hedge_policy is not None:
+            # Hedged requests run in threads, where only clients are thread-safe
+            method = self._hedged(
+                self._reader("get_item", self.table.meta.client.get_item)
+            )
+            kwargs["TableName"] = self.table_name
+
+        with self.instrumentation.record("get_item") as recorder:
+            response = self._call("read", 1.0, method, kwargs, recorder)
+            recorder.page(response, 1 if "Item" in response else 0)
+        item = self._decompress([response.get("Item", {})])[0]
+        if resolve:
+            self._load_overflow([item])
+        return item
+
+    def get_items(self, keys):
+        """Get items by primary key with BatchGetItem
+
+        :param keys: list of key dicts, without duplicates
+        :return: list [...items...], in no particular order
+        """
+        method = self._reader("batch_get_item", self.table.meta.client.batch_get_item)
+        if self.hedge_policy is not None:
+            method = self._hedged(method)
+
+        items = []
+        pending = deque(keys)
+        attempt = 0
+        with self.instrumentation.record("get_items") as recorder:
+            while pending:
+                size = min(BATCH_GET_SIZE, len(pending))
+                chunk = [pending.popleft() for _ in range(size)]
+                response = self._call(
+                    "read",
+                    float(len(chunk)),
+                    method,
+                    {"RequestItems": {self.table_name: {"Keys": chunk}}},
+                    recorder,
+                )
+                found = response.get("Responses", {}).get(self.table_name, [])
+                items.extend(self._decompress(found))
+                recorder.page(response, len(found))
+                unprocessed = response.get("UnprocessedKeys", {}).get(self.table_name)
+                if unprocessed:
+                    pending.extend(unprocessed["Keys"])
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+                    attempt += 1
+                else:
+                    attempt = 0
+        return self._load_overflow(items)
 
     def query_items(self, data, key, startKey=None, index_name=None):
         if startKey:
@@ -86,6 +259,15 @@ class DynamodbTable:
         :param startKey: default=None
         :return: dist object {"Items": [...items...], "ExclusiveStartKey":"...next page start key(if there is next page)..."}
         """
+        if self.single_flight is not None:
+            return self.single_flight.do(
+                "query_items",
+                freeze((self.table_name, data, key, index_name)),
+                lambda: self._query_items(data, key, index_name),
+            )
+        return self._query_items(data, key, index_name)
+
+    def _query_items(self, data, key, index_name):
         if isinstance(key, dict):
             if key["operator"] == "in":
                 FilterExpression = Attr(key["range"]).is_in(data["range"])
@@ -117,72 +299,180 @@ class DynamodbTable:
             query_kwargs["IndexName"] = index_name
 
         items = []
-        key = None
-        while True:
-            if key:
-                query_kwargs["ExclusiveStartKey"] = key
+        with self.instrumentation.record("query_items") as recorder:
+            for response in self._pages(self._reader("query"), query_kwargs, recorder):
+                items.extend(response.get("Items", []))
 
-            response = self.table.query(**query_kwargs)
-            items.extend(response.get("Items", []))
-            key = response.get("LastEvaluatedKey")
+        return {"Items": items, "ExclusiveStartKey": None}
 
-            if not key:
+    def _serialize(self, data):
+        item = json.loads(json.dumps(data, default=json_encoder), parse_float=Decimal)
+        if self.compression is not None:
+            item = self.compression.compress_item(
+                item, (self.hash_key, self.partition_key)
+            )
+        return item
+
+    def _decompress(self, items):
+        if self.compression is not None:
+            for item in items:
+                self.compression.decompress_item(item, self.native_numbers)
+        return items
+
+    def _offload(self, items):
+        """Move the large attributes of items to S3, when overflow is set"""
+        if self.overflow is None:
+            return items
+        key_attributes = [x for x in (self.hash_key, self.partition_key) if x]
+        return self.overflow.offload_items(items, key_attributes)
+
+    def _load_overflow(self, items):
+        if self.overflow is not None and self.overflow.resolve_pointers:
+            self.overflow.resolve_items(items, self.native_numbers)
+        return items
+
+    def _batch_write(self, requests, recorder):
+        """Send put/delete requests with BatchWriteItem
+
+        Requests go out BATCH_WRITE_SIZE at a time. Unprocessed items are
+        queued again and sent after a short, growing delay.
+        """
+        client = self.table.meta.client
+        pending = deque()
+        requests = iter(requests)
+        attempt = 0
+        while True:
+            for r in requests:
+                pending.append(r)
+                if len(pending) >= BATCH_WRITE_SIZE:
+                    break
+            if not pending:
                 break
 
-        return {"Items": items, "ExclusiveStartKey": None}
+            size = min(BATCH_WRITE_SIZE, len(pending))
+            chunk = [pending.popleft() for _ in range(size)]
+            response = self._call(
+                "write",
+                float(len(chunk)),
+                client.batch_write_item,
+                {"RequestItems": {self.table_name: chunk}},
+                recorder,
+            )
+            unprocessed = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            recorder.page(response, len(chunk) - len(unprocessed))
+            if unprocessed:
+                pending.extend(unprocessed)
+                bucket = getattr(self.rate_limiter, "write", None)
+                if bucket is not None:
+                    bucket.throttled()
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+                attempt += 1
+            else:
+                attempt = 0
+
+    def _put_item(self, operation, data):
+        with self.instrumentation.record(operation) as recorder:
+            response = self._call(
+                "write", 1.0, self.table.put_item, {"Item": data}, recorder
+            )
+            recorder.page(response, 1)
+        return response
 
     def add(self, data):
         if self.validator:
             if not self.validator.validate(data):
                 raise SchemaError(self.validator.errors)
 
-        data = json.loads(json.dumps(data, default=json_encoder), parse_float=Decimal)
-
-        return self.table.put_item(Item=data)
+        (data,) = self._offload([data])
+        return self._put_item("add", self._serialize(data))
 
     def update(self, data, key):
-        item = self.get_item(key)
+        # Not coalesced: the item is modified below
+        item = self._get_item(key, resolve=False)
 
         if item:
+            if self.overflow is None:
+                item.update(data)
+                return self._put_item("update", self._serialize(item))
+
+            previous = self.overflow.object_names(item)
             item.update(data)
-            return self.table.put_item(
-                Item=json.loads(
-                    json.dumps(item, default=json_encoder), parse_float=Decimal
-                )
-            )
+            (item,) = self._offload([item])
+            response = self._put_item("update", self._serialize(item))
+            self.overflow.delete_objects(previous - self.overflow.object_names(item))
+            return response
 
     def delete(self, key: dict):
-        return self.table.delete_item(Key=key)
+        if self.overflow is not None:
+            item = self._get_item(key, resolve=False)
+        with self.instrumentation.record("delete") as recorder:
+            response = self._call(
+                "write", 1.0, self.table.delete_item, {"Key": key}, recorder
+            )
+            recorder.page(response, 1)
+        if self.overflow is not None:
+            self.overflow.delete_objects(self.overflow.object_names(item))
+        return response
+
+    def snapshot(self, **kwargs):
+        """TableSnapshot answering this table's reads from memory
 
-    def batch_add(self, data):
+        :param kwargs: TableSnapshot parameters
+        """
+        return TableSnapshot(self, **kwargs)
+
+    def validate_items(self, data):
+        """Validate a list of items against the table schema
+
+        :raise: SchemaError on the first invalid item
+        """
         if self.validator:
             for x in data:
                 if not self.validator.validate(x):
                     raise SchemaError(self.validator.errors)
 
-        with self.table.batch_writer() as batch:
-            for r in data:
-                r = json.loads(json.dumps(r, default=json_encoder), parse_float=Decimal)
-                batch.put_item(Item=r)
+    def batch_add(self, data, validate=True):
+        if validate:
+            self.validate_items(data)
+        data = self._offload(data)
+
+        with self.instrumentation.record("batch_add") as recorder:
+            self._batch_write(
+                ({"PutRequest": {"Item": self._serialize(r)}} for r in data), recorder
+            )
 
         return True
 
     def get_all(self):
         final_result = []
-        scan_kwargs = {}
-        done = False
-        start_key = None
-
-        while not done:
-            if start_key:
-                scan_kwargs["ExclusiveStartKey"] = start_key
-            response = self.table.scan(**scan_kwargs)
-            final_result.extend(response.get("Items", []))
-            start_key = response.get("LastEvaluatedKey", None)
-            done = start_key is None
+        with self.instrumentation.record("get_all") as recorder:
+            for response in self._pages(self._reader("scan"), {}, recorder):
+                final_result.extend(response.get("Items", []))
 
         return final_result
 
+    def scan_pages(self, segment=None, total_segments=None, **scan_kwargs):
+        """Yield the items of a table scan, one page at a time
+
+        Pages go through the table client, which is thread-safe, so parallel
+        scan segments can run in threads.
+
+        :param segment: parallel scan segment, used with total_segments
+        :param total_segments: number of parallel scan segments
+        :param scan_kwargs: extra Scan parameters
+        :return: generator of lists [...items...]
+        """
+        scan_kwargs["TableName"] = self.table_name
+        if total_segments:
+            scan_kwargs["Segment"] = segment
+            scan_kwargs["TotalSegments"] = total_segments
+
+        client = self.table.meta.client
+        with self.instrumentation.record("scan_pages") as recorder:
+            scan = self._reader("scan", client.scan)
+            for response in self._pages(scan, scan_kwargs, recorder):
+                yield response.get("Items", [])
+
     def get_all_filtered_items(self, data: any, key: str, operator: str = "in") -> list:
         """Get all filtered items from DynamoDB Table.
 
@@ -193,32 +483,18 @@ class DynamodbTable:
 
         final_result = list()
         scan_kwargs = {}
-        done = False
-        start_key = None
         if operator == "in":
             scan_kwargs["FilterExpression"] = Attr(key).is_in(data)
 
-        while not done:
-            if start_key:
-                scan_kwargs["ExclusiveStartKey"] = start_key
-            response = self.table.scan(**scan_kwargs)
-            final_result.extend(response.get("Items", []))
-            start_key = response.get("LastEvaluatedKey", None)
-            done = start_key is None
+        with self.instrumentation.record("get_all_filtered_items") as recorder:
+            for response in self._pages(self._reader("scan"), scan_kwargs, recorder):
+                final_result.extend(response.get("Items", []))
 
         return final_result
 
     def query(self, query_kwargs):
         items = []
-        key = None
-        while True:
-            if key:
-                query_kwargs["ExclusiveStartKey"] = key
-
-            response = self.table.query(**query_kwargs)
-            items.extend(response.get("Items", []))
-            key = response.get("LastEvaluatedKey")
-
-            if not key:
-                break
+        with self.instrumentation.record("query") as recorder:
+            for response in self._pages(self._reader("query"), query_kwargs, recorder):
+                items.extend(response.get("Items", []))
         return items
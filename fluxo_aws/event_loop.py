@@ -0,0 +1,38 @@
+import asyncio
+
+_event_loop = None
+
+
+def get_event_loop():
+    """Get the event loop shared by every async handler in this process
+
+    The loop is created on first use and kept open, so async clients and
+    connection pools created on it survive between warm lambda invocations.
+
+    :return: asyncio event loop
+    """
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_event_loop)
+    return _event_loop
+
+
+def run_until_complete(coroutine):
+    """Run a coroutine on the shared event loop
+
+    :param coroutine: awaitable to run
+    :raise: RuntimeError if called while an event loop is already running
+    :return: coroutine result
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coroutine.close()
+        raise RuntimeError(
+            "Async handler called from a running event loop, "
+            "await the undecorated handler instead"
+        )
+    return get_event_loop().run_until_complete(coroutine)
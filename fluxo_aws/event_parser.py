@@ -1,65 +1,145 @@
 import json
+import inspect
+import asyncio
+from base64 import b64decode
 from functools import wraps
 
+_NOT_LOADED = object()
+
+
+def _load_value(resource, is_base64_encoded=False):
+    if not resource:
+        return {}
+    if type(resource) == dict:
+        return resource
+    if is_base64_encoded:
+        resource = b64decode(resource)
+    return json.loads(resource)
+
 
 class ParsedEvent:
-    def __init__(self, headers, query, body, path):
-        self.headers = headers
-        self.query = query
-        self.body = body
-        self.path = path
+    """Lambda event exposing headers, query, body and path parameters as dicts
 
-    def get(self, q, default=None):
-        if self.body.get(q):
-            return self.body.get(q)
-        elif self.query.get(q):
-            return self.query.get(q)
-        elif self.headers.get(q):
-            return self.headers.get(q)
-        elif self.path.get(q):
-            return self.path.get(q)
-        else:
-            return default
+    ``query`` and ``body`` are kept raw and only decoded on first access.
+    """
+
+    __slots__ = (
+        "headers",
+        "path",
+        "_raw_query",
+        "_raw_body",
+        "_query",
+        "_body",
+        "_is_base64_encoded",
+    )
 
+    def __init__(self, headers, query, body, path, is_base64_encoded=False):
+        self.headers = _load_value(headers)
+        self.path = _load_value(path)
+        self._raw_query = query
+        self._raw_body = body
+        self._query = _NOT_LOADED
+        self._body = _NOT_LOADED
+        self._is_base64_encoded = is_base64_encoded
 
-def _load_resource(event, name):
-    if name not in event.keys():
-        resource = {}
-    else:
-        resource = event.get(name)
-        if not resource:
-            resource = {}
-        elif type(resource) != dict:
-            resource = json.loads(resource)
-    return resource
+    @property
+    def query(self):
+        if self._query is _NOT_LOADED:
+            self._query = _load_value(self._raw_query)
+        return self._query
+
+    @query.setter
+    def query(self, value):
+        self._query = value
+
+    @property
+    def body(self):
+        if self._body is _NOT_LOADED:
+            self._body = _load_value(self._raw_body, self._is_base64_encoded)
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    def get(self, q, default=None):
+        value = self.body.get(q)
+        if value:
+            return value
+        value = self.query.get(q)
+        if value:
+            return value
+        value = self.headers.get(q)
+        if value:
+            return value
+        value = self.path.get(q)
+        if value:
+            return value
+        return default
 
 
 def _parse_event(event):
     if type(event) == ParsedEvent:
         return event
-    headers = _load_resource(event, "headers")
-    query = _load_resource(event, "queryStringParameters")
-    body = _load_resource(event, "body")
-    path = _load_resource(event, "pathParameters")
-    return ParsedEvent(headers, query, body, path)
+    return ParsedEvent(
+        event.get("headers"),
+        event.get("queryStringParameters"),
+        event.get("body"),
+        event.get("pathParameters"),
+        event.get("isBase64Encoded", False),
+    )
+
+
+def _event_position(func, event_name):
+    try:
+        parameters = list(inspect.signature(func).parameters.values())
+    except (TypeError, ValueError):
+        return None
+
+    for index, parameter in enumerate(parameters):
+        if parameter.kind not in (
+            parameter.POSITIONAL_ONLY,
+            parameter.POSITIONAL_OR_KEYWORD,
+        ):
+            break
+        if parameter.name == event_name:
+            return index
+    return None
 
 
 def event_parser(func):
+    """Decorate a lambda handler to receive its event as a ParsedEvent
+
+    ``async def`` handlers stay awaitable. To use one as the lambda entry
+    point, put ``prepare_response`` as the outer decorator: it runs the
+    handler on the shared event loop.
+    """
     event_name = "event"
+    position = _event_position(func, event_name)
 
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        func_args = func.__code__.co_varnames
-        if event_name in func_args:
-            event = args[func_args.index(event_name)]
-            list_args = list(args)
-            list_args[func_args.index(event_name)] = _parse_event(event)
-            args = tuple(list_args)
-        elif event_name in kwargs.keys():
-            event = kwargs[event_name]
-            kwargs[event_name] = _parse_event(event)
+    def parse_args(args, kwargs):
+        if position is not None and len(args) > position:
+            args = (
+                args[:position] + (_parse_event(args[position]),) + args[position + 1 :]
+            )
+        elif event_name in kwargs:
+            kwargs[event_name] = _parse_event(kwargs[event_name])
         else:
             raise ValueError(f"{event_name} not in args or kwargs")
+        return args, kwargs
+
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            args, kwargs = parse_args(args, kwargs)
+            return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        args, kwargs = parse_args(args, kwargs)
         return func(*args, **kwargs)
 
     return wrapper
@@ -0,0 +1,129 @@
+from decimal import Decimal
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer
+
+_serializer = TypeSerializer()
+
+
+def _native_number(text):
+    if "." in text or "e" in text or "E" in text:
+        return float(text)
+    return int(text)
+
+
+def _make_deserializer(number):
+    def deserialize(value):
+        ((tag, data),) = value.items()
+        if tag == "S":
+            return data
+        elif tag == "N":
+            return number(data)
+        elif tag == "M":
+            return {k: deserialize(v) for k, v in data.items()}
+        elif tag == "L":
+            return [deserialize(v) for v in data]
+        elif tag == "BOOL":
+            return data
+        elif tag == "NULL":
+            return None
+        elif tag == "B":
+            # botocore already decoded base64, keep the bytes as is
+            return data
+        elif tag == "SS" or tag == "BS":
+            return set(data)
+        elif tag == "NS":
+            return {number(x) for x in data}
+        raise TypeError(f"Unknown DynamoDB type {tag}")
+
+    return deserialize
+
+
+_deserialize_decimal = _make_deserializer(Decimal)
+_deserialize_native = _make_deserializer(_native_number)
+
+
+def deserialize_value(value, native_numbers=False):
+    """Turn a low-level client attribute value into a python value
+
+    :param value: typed value, e.g. {"N": "1.5"}
+    :param native_numbers: numbers as int/float instead of Decimal
+    """
+    if native_numbers:
+        return _deserialize_native(value)
+    return _deserialize_decimal(value)
+
+
+def deserialize_item(item, native_numbers=False):
+    """Turn a low-level client item into a dict of python values
+
+    Unlike boto3's TypeDeserializer, binary values are returned as bytes
+    instead of Binary.
+
+    :param item: typed item, e.g. {"id": {"S": "1"}, "price": {"N": "1.5"}}
+    :param native_numbers: numbers as int/float instead of Decimal
+    """
+    deserialize = _deserialize_native if native_numbers else _deserialize_decimal
+    return {k: deserialize(v) for k, v in item.items()}
+
+
+def serialize_key(key):
+    """Turn a python key dict into a low-level client key"""
+    return {k: _serializer.serialize(v) for k, v in key.items()}
+
+
+def client_kwargs(kwargs):
+    """Turn Table query/scan/get_item parameters into low-level client ones
+
+    Key and Filter conditions are built into expressions, their values and
+    ExpressionAttributeValues serialized, Key and ExclusiveStartKey too.
+    """
+    kwargs = dict(kwargs)
+    builder = ConditionExpressionBuilder()
+    names = dict(kwargs.get("ExpressionAttributeNames", {}))
+    values = dict(kwargs.get("ExpressionAttributeValues", {}))
+    for name in ("KeyConditionExpression", "FilterExpression"):
+        condition = kwargs.get(name)
+        if isinstance(condition, ConditionBase):
+            expression = builder.build_expression(
+                condition, is_key_condition=name == "KeyConditionExpression"
+            )
+            kwargs[name] = expression.condition_expression
+            names.update(expression.attribute_name_placeholders)
+            values.update(expression.attribute_value_placeholders)
+
+    if names:
+        kwargs["ExpressionAttributeNames"] = names
+    if values:
+        kwargs["ExpressionAttributeValues"] = serialize_key(values)
+    for name in ("Key", "ExclusiveStartKey"):
+        if name in kwargs:
+            kwargs[name] = serialize_key(kwargs[name])
+    if "RequestItems" in kwargs:
+        kwargs["RequestItems"] = {
+            table: dict(request, Keys=[serialize_key(x) for x in request["Keys"]])
+            for table, request in kwargs["RequestItems"].items()
+        }
+    return kwargs
+
+
+def deserialize_response(response, native_numbers=False):
+    """Deserialize the items and keys of a low-level client read response
+
+    Items follow native_numbers, LastEvaluatedKey and UnprocessedKeys always
+    use Decimal so they can be sent back exactly.
+    """
+    if "Items" in response:
+        response["Items"] = [
+            deserialize_item(x, native_numbers) for x in response["Items"]
+        ]
+    if "Item" in response:
+        response["Item"] = deserialize_item(response["Item"], native_numbers)
+    if "LastEvaluatedKey" in response:
+        response["LastEvaluatedKey"] = deserialize_item(response["LastEvaluatedKey"])
+    for table, items in response.get("Responses", {}).items():
+        response["Responses"][table] = [
+            deserialize_item(x, native_numbers) for x in items
+        ]
+    for request in response.get("UnprocessedKeys", {}).values():
+        request["Keys"] = [deserialize_item(x) for x in request["Keys"]]
+    return response
@@ -0,0 +1,209 @@
+import json
+import sys
+import time
+
+
+class OperationMetric:
+    """Cost of a single table or bucket call, as sent to metrics sinks
+
+    latency is in seconds. consumed_capacity, read_capacity_units and
+    write_capacity_units are summed from every ConsumedCapacity returned
+    by DynamoDB during the call.
+    """
+
+    __slots__ = (
+        "operation",
+        "resource",
+        "timestamp",
+        "latency",
+        "pages",
+        "items",
+        "bytes",
+        "retries",
+        "consumed_capacity",
+        "read_capacity_units",
+        "write_capacity_units",
+        "error",
+    )
+
+    def __init__(self, operation, resource, timestamp):
+        self.operation = operation
+        self.resource = resource
+        self.timestamp = timestamp
+        self.latency = 0.0
+        self.pages = 0
+        self.items = 0
+        self.bytes = 0
+        self.retries = 0
+        self.consumed_capacity = 0.0
+        self.read_capacity_units = 0.0
+        self.write_capacity_units = 0.0
+        self.error = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _NoopRecorder:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def page(self, response, items=None):
+        pass
+
+    def add(self, items=0, bytes=0, retries=0):
+        pass
+
+
+NOOP_RECORDER = _NoopRecorder()
+
+
+class _Recorder:
+    __slots__ = ("sinks", "metric", "start")
+
+    def __init__(self, sinks, operation, resource):
+        self.sinks = sinks
+        self.metric = OperationMetric(operation, resource, time.time())
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metric = self.metric
+        metric.latency = time.perf_counter() - self.start
+        if exc_type is not None:
+            metric.error = exc_type.__name__
+        for sink in self.sinks:
+            sink(metric)
+        return False
+
+    def page(self, response, items=None):
+        """Account for one round trip response
+
+        :param response: boto3 response dict
+        :param items: number of items returned, defaults to len(response["Items"])
+        """
+        metric = self.metric
+        metric.pages += 1
+        if items is None:
+            items = len(response.get("Items", ()))
+        metric.items += items
+
+        metadata = response.get("ResponseMetadata") or {}
+        metric.retries += metadata.get("RetryAttempts", 0)
+        length = (metadata.get("HTTPHeaders") or {}).get("content-length")
+        if length:
+            metric.bytes += int(length)
+
+        capacity = response.get("ConsumedCapacity")
+        if capacity:
+            if isinstance(capacity, dict):
+                capacity = (capacity,)
+            for x in capacity:
+                metric.consumed_capacity += float(x.get("CapacityUnits", 0))
+                metric.read_capacity_units += float(x.get("ReadCapacityUnits", 0))
+                metric.write_capacity_units += float(x.get("WriteCapacityUnits", 0))
+
+    def add(self, items=0, bytes=0, retries=0):
+        metric = self.metric
+        metric.items += items
+        metric.bytes += bytes
+        metric.retries += retries
+
+
+class Instrumentation:
+    """Per table/bucket entry point for metrics sinks
+
+    When no sink is configured, record() returns a shared no-op recorder and
+    no ReturnConsumedCapacity is requested, so calls pay almost nothing.
+
+    :param resource: table or bucket name reported in metrics
+    :param sinks: callable, or list of callables, receiving an OperationMetric
+    :param return_consumed_capacity: "TOTAL", "INDEXES" or "NONE". Defaults to
+        "TOTAL" when there is a sink
+    """
+
+    def __init__(self, resource, sinks=None, return_consumed_capacity=None):
+        if callable(sinks):
+            sinks = (sinks,)
+        self.resource = resource
+        self.sinks = tuple(sinks or ())
+        if return_consumed_capacity is None and self.sinks:
+            return_consumed_capacity = "TOTAL"
+        self.return_consumed_capacity = return_consumed_capacity
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def record(self, operation):
+        if not self.sinks:
+            return NOOP_RECORDER
+        return _Recorder(self.sinks, operation, self.resource)
+
+    def request_kwargs(self, kwargs):
+        if self.return_consumed_capacity:
+            kwargs["ReturnConsumedCapacity"] = self.return_consumed_capacity
+        return kwargs
+
+
+class EMFMetricsSink:
+    """Write metrics to stdout in CloudWatch Embedded Metric Format
+
+    Lambda ships stdout to CloudWatch Logs, which extracts the metrics, so
+    no network call is made.
+
+    :param namespace: CloudWatch metrics namespace
+    :param stream: file object to write to, default sys.stdout
+    """
+
+    units = (
+        ("Latency", "Milliseconds"),
+        ("Pages", "Count"),
+        ("Items", "Count"),
+        ("Bytes", "Bytes"),
+        ("Retries", "Count"),
+        ("ConsumedCapacity", "Count"),
+    )
+
+    def __init__(self, namespace="FluxoAws", stream=None):
+        self.namespace = namespace
+        self.stream = stream
+
+    def __call__(self, metric):
+        record = {
+            "_aws": {
+                "Timestamp": int(metric.timestamp * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Resource", "Operation"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit} for name, unit in self.units
+                        ],
+                    }
+                ],
+            },
+            "Resource": metric.resource,
+            "Operation": metric.operation,
+            "Latency": metric.latency * 1000,
+            "Pages": metric.pages,
+            "Items": metric.items,
+            "Bytes": metric.bytes,
+            "Retries": metric.retries,
+            "ConsumedCapacity": metric.consumed_capacity,
+            "ReadCapacityUnits": metric.read_capacity_units,
+            "WriteCapacityUnits": metric.write_capacity_units,
+        }
+        if metric.error:
+            record["Error"] = metric.error
+
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record) + "\n")
+        stream.flush()
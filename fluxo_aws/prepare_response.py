@@ -1,49 +1,221 @@
 from functools import wraps
+from base64 import b64encode
 from .json_encoder import json_encoder
+from .event_loop import run_until_complete
+from .event_parser import _event_position
+import asyncio
 import json
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_COMPRESS_SIZE = 1024
 
 mapping = {
-    bytes: lambda x: x.decode(),
+    # bytes bodies are kept as is and sent base64 encoded
+    bytes: lambda x: x,
 }
 
 
-def prepare_response(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        result = func(*args, **kwargs)
-        if not result:
-            result = {}
-        if type(result) == tuple:
-            keys = ["statusCode", "body", "headers"]
-            result = {
-                keys[i]: mapping.get(type(result[i]), type(result[i]))(result[i])
-                for i in range(len(result))
-            }
-        elif type(result) == int:
-            # Assuming status_code
-            result = {"statusCode": result}
+def _compress_gzip(body, level):
+    return gzip.compress(body, compresslevel=6 if level is None else level)
+
+
+def _compress_brotli(body, level):
+    if level is None:
+        return brotli.compress(body)
+    return brotli.compress(body, quality=level)
+
+
+compressors = {"gzip": _compress_gzip}
+if brotli is not None:
+    compressors["br"] = _compress_brotli
+
+
+def _get_header(headers, name):
+    if not headers:
+        return None
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _get_request_headers(args, kwargs, position):
+    if position is not None and len(args) > position:
+        event = args[position]
+    else:
+        event = kwargs.get("event")
+    if isinstance(event, dict):
+        return event.get("headers")
+    return getattr(event, "headers", None)
+
+
+def _accepted_encodings(accept_encoding):
+    """Parse an Accept-Encoding header value
+
+    :param accept_encoding: header value, e.g. "gzip, br;q=0.8"
+    :return: dict object {"<encoding>": <quality>}
+    """
+    accepted = {}
+    if not accept_encoding:
+        return accepted
+
+    for part in accept_encoding.split(","):
+        params = part.strip().split(";")
+        encoding = params[0].strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def _choose_encoding(accept_encoding, encodings):
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        if encoding not in compressors:
+            continue
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _add_vary(headers, value):
+    for key in headers.keys():
+        if key.lower() == "vary":
+            current = [x.strip().lower() for x in str(headers[key]).split(",")]
+            if value.lower() not in current and "*" not in current:
+                headers[key] = f"{headers[key]}, {value}"
+            return
+    headers["Vary"] = value
+
+
+def _build_response(result, request_headers, options):
+    if not result:
+        result = {}
+    if type(result) == tuple:
+        keys = ["statusCode", "body", "headers"]
+        result = {
+            keys[i]: mapping.get(type(result[i]), type(result[i]))(result[i])
+            for i in range(len(result))
+        }
+    elif type(result) == int:
+        # Assuming status_code
+        result = {"statusCode": result}
+
+    status_code = result.get("statusCode", 200)
+    body = result.get("body", {})
+    headers = result.get("headers", {})
+    is_base64_encoded = result.get("isBase64Encoded", False)
+    if type(body) in (dict, list):
+        body = json.dumps(body, default=json_encoder)
+
+    if type(headers) != dict:
+        raise ValueError("headers must be dict")
+
+    if "Content-Type" not in headers.keys():
+        headers["Content-Type"] = "application/json"
+
+    if "Access-Control-Allow-Methods" not in headers.keys():
+        headers["Access-Control-Allow-Methods"] = "*"
+
+    if "Access-Control-Allow-Origin" not in headers.keys():
+        headers["Access-Control-Allow-Origin"] = "*"
+
+    if "Access-Control-Allow-Credentials" not in headers.keys():
+        headers["Access-Control-Allow-Credentials"] = True
+
+    if options["compress"] and not is_base64_encoded:
+        _add_vary(headers, "Accept-Encoding")
+        raw = body.encode() if isinstance(body, str) else body
+        if (
+            isinstance(raw, bytes)
+            and len(raw) >= options["min_compress_size"]
+            and _get_header(headers, "Content-Encoding") is None
+        ):
+            encoding = _choose_encoding(
+                _get_header(request_headers, "Accept-Encoding"), options["encodings"]
+            )
+            if encoding:
+                body = compressors[encoding](raw, options["compression_level"])
+                headers["Content-Encoding"] = encoding
+
+    if isinstance(body, bytes):
+        body = b64encode(body).decode()
+        is_base64_encoded = True
+
+    response = {"statusCode": status_code, "body": body, "headers": headers}
+    if is_base64_encoded:
+        response["isBase64Encoded"] = True
+    return response
+
+
+def prepare_response(
+    func=None,
+    compress=False,
+    min_compress_size=DEFAULT_MIN_COMPRESS_SIZE,
+    compression_level=None,
+    encodings=("br", "gzip"),
+):
+    """Decorate a lambda handler to build an API Gateway response
+
+    Can be used bare (``@prepare_response``) or with options
+    (``@prepare_response(compress=True)``). ``async def`` handlers are run on
+    an event loop that is kept between invocations, so the decorated handler
+    can be used directly as the lambda entry point.
+
+    :param compress: compress the body when the request Accept-Encoding allows it
+    :param min_compress_size: smallest body, in bytes, that gets compressed
+    :param compression_level: gzip level (1-9) or brotli quality (0-11)
+    :param encodings: encodings to offer, in order of preference. "br" requires brotli
+    """
+    options = {
+        "compress": compress,
+        "min_compress_size": min_compress_size,
+        "compression_level": compression_level,
+        "encodings": encodings,
+    }
 
-        status_code = result.get("statusCode", 200)
-        body = result.get("body", {})
-        headers = result.get("headers", {})
-        if type(body) in (dict, list):
-            body = json.dumps(body, default=json_encoder)
+    def decorator(func):
+        position = _event_position(func, "event")
 
-        if type(headers) != dict:
-            raise ValueError("headers must be dict")
+        def build(result, args, kwargs):
+            request_headers = None
+            if compress:
+                request_headers = _get_request_headers(args, kwargs, position)
+            return _build_response(result, request_headers, options)
 
-        if "Content-Type" not in headers.keys():
-            headers["Content-Type"] = "application/json"
+        if asyncio.iscoroutinefunction(func):
 
-        if "Access-Control-Allow-Methods" not in headers.keys():
-            headers["Access-Control-Allow-Methods"] = "*"
+            @wraps(func)
+            def async_wrapper(*args, **kwargs):
+                result = run_until_complete(func(*args, **kwargs))
+                return build(result, args, kwargs)
 
-        if "Access-Control-Allow-Origin" not in headers.keys():
-            headers["Access-Control-Allow-Origin"] = "*"
+            return async_wrapper
 
-        if "Access-Control-Allow-Credentials" not in headers.keys():
-            headers["Access-Control-Allow-Credentials"] = True
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            return build(result, args, kwargs)
 
-        return {"statusCode": status_code, "body": body, "headers": headers}
+        return wrapper
 
-    return wrapper
+    if func is None:
+        return decorator
+    return decorator(func)
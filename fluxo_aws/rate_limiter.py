@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from botocore.exceptions import ClientError
+
+THROTTLING_ERRORS = (
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+)
+
+
+def is_throttling_error(error):
+    if not isinstance(error, ClientError):
+        return False
+    return error.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+
+
+def consumed_capacity_units(response):
+    """Sum the CapacityUnits of a DynamoDB response
+
+    :param response: boto3 response dict, requested with ReturnConsumedCapacity
+    :return: float, or None if the response has no ConsumedCapacity
+    """
+    capacity = response.get("ConsumedCapacity")
+    if not capacity:
+        return None
+    if isinstance(capacity, dict):
+        return float(capacity.get("CapacityUnits", 0))
+    return sum(float(x.get("CapacityUnits", 0)) for x in capacity)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` units per second
+
+    Callers reserve units up front (the bucket may go negative) and then wait
+    for the returned delay outside the lock, so threads and asyncio tasks can
+    share one bucket. The effective rate drops on throttling and recovers
+    additively on every successful call, up to the configured rate.
+
+    :param rate: capacity units per second
+    :param burst: bucket size, default one second worth of units
+    :param min_rate: floor for the effective rate after throttling
+    :param decrease: factor applied to the effective rate on throttling
+    :param increase: fraction of ``rate`` added back after each successful call
+    :param max_throttle_retries: throttled calls retried before raising
+    """
+
+    def __init__(
+        self,
+        rate,
+        burst=None,
+        min_rate=None,
+        decrease=0.5,
+        increase=0.05,
+        max_throttle_retries=10,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.current_rate = self.rate
+        self.burst = float(burst or rate)
+        self.min_rate = float(min_rate or self.rate / 20)
+        self.decrease = decrease
+        self.increase = increase
+        self.max_throttle_retries = max_throttle_retries
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.current_rate
+        )
+        self.updated = now
+
+    def reserve(self, units):
+        """Take units from the bucket
+
+        :return: seconds to wait before using them
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= units
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.current_rate
+
+    def acquire(self, units):
+        delay = self.reserve(units)
+        if delay:
+            time.sleep(delay)
+
+    async def async_acquire(self, units):
+        delay = self.reserve(units)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def consumed(self, reserved, actual):
+        """Settle a reservation with the capacity actually consumed"""
+        with self.lock:
+            if actual is not None:
+                self.tokens -= actual - reserved
+            self.current_rate = min(
+                self.rate, self.current_rate + self.rate * self.increase
+            )
+
+    def throttled(self):
+        """Slow down after a throttling error"""
+        with self.lock:
+            self._refill()
+            self.current_rate = max(self.min_rate, self.current_rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class CapacityRateLimiter:
+    """Read and write capacity budget shared by tables in one process
+
+    :param read_capacity_units: RCU per second, None for unlimited reads
+    :param write_capacity_units: WCU per second, None for unlimited writes
+    :param kwargs: extra TokenBucket parameters
+    """
+
+    def __init__(self, read_capacity_units=None, write_capacity_units=None, **kwargs):
+        self.read = None
+        self.write = None
+        if read_capacity_units:
+            self.read = TokenBucket(read_capacity_units, **kwargs)
+        if write_capacity_units:
+            self.write = TokenBucket(write_capacity_units, **kwargs)
+
+
+def limited_call(bucket, units, method, kwargs, recorder=None):
+    """Call a DynamoDB method paced by a token bucket
+
+    Throttled calls slow the bucket down and are retried up to
+    bucket.max_throttle_retries times, each counted in recorder if given.
+
+    :return: boto3 response
+    """
+    attempt = 0
+    while True:
+        bucket.acquire(units)
+        try:
+            response = method(**kwargs)
+        except ClientError as e:
+            if not is_throttling_error(e) or attempt >= bucket.max_throttle_retries:
+                raise
+            bucket.throttled()
+            attempt += 1
+            if recorder is not None:
+                recorder.add(retries=1)
+            continue
+        bucket.consumed(units, consumed_capacity_units(response))
+        return response
+
+
+async def async_limited_call(bucket, units, method, kwargs, recorder=None):
+    """Async version of limited_call"""
+    attempt = 0
+    while True:
+        await bucket.async_acquire(units)
+        try:
+            response = await method(**kwargs)
+        except ClientError as e:
+            if not is_throttling_error(e) or attempt >= bucket.max_throttle_retries:
+                raise
+            bucket.throttled()
+            attempt += 1
+            if recorder is not None:
+                recorder.add(retries=1)
+            continue
+        bucket.consumed(units, consumed_capacity_units(response))
+        return response
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+from .rate_limiter import (
+    THROTTLING_ERRORS,
+    is_throttling_error,
+    consumed_capacity_units,
+)
+
+RETRYABLE_ERRORS = THROTTLING_ERRORS + (
+    "InternalServerError",
+    "ServiceUnavailable",
+    "RequestTimeout",
+    "TransactionInProgressException",
+)
+
+
+class RetryPolicy:
+    """Retry a single request with decorrelated jitter backoff
+
+    Each delay is drawn uniformly between ``base_delay`` and three times the
+    previous delay, capped at ``max_delay``. Table pagination retries page by
+    page, so a failure resumes from the last LastEvaluatedKey.
+
+    :param max_attempts: total attempts per request, including the first one
+    :param base_delay: smallest delay in seconds
+    :param max_delay: largest delay in seconds
+    :param retryable_errors: ClientError codes worth retrying
+    """
+
+    def __init__(
+        self,
+        max_attempts=5,
+        base_delay=0.05,
+        max_delay=5.0,
+        retryable_errors=RETRYABLE_ERRORS,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable_errors = retryable_errors
+
+    def is_retryable(self, error):
+        if isinstance(error, ClientError):
+            code = error.response.get("Error", {}).get("Code")
+            return code in self.retryable_errors
+        return isinstance(error, (ConnectionError, HTTPClientError))
+
+    def delays(self):
+        delay = self.base_delay
+        while True:
+            delay = min(self.max_delay, random.uniform(self.base_delay, delay * 3))
+            yield delay
+
+    def call(self, method, kwargs, bucket=None, units=1.0, recorder=None):
+        """Call method(**kwargs), retrying retryable errors
+
+        :param bucket: optional TokenBucket pacing every attempt
+        :param units: capacity units reserved from bucket per attempt
+        :param recorder: optional metrics recorder, retries are added to it
+        :return: boto3 response
+        """
+        delays = self.delays()
+        attempt = 1
+        while True:
+            if bucket is not None:
+                bucket.acquire(units)
+            try:
+                response = method(**kwargs)
+            except Exception as e:
+                if bucket is not None and is_throttling_error(e):
+                    bucket.throttled()
+                if attempt >= self.max_attempts or not self.is_retryable(e):
+                    raise
+                attempt += 1
+                if recorder is not None:
+                    recorder.add(retries=1)
+                time.sleep(next(delays))
+                continue
+            if bucket is not None:
+                bucket.consumed(units, consumed_capacity_units(response))
+            return response
+
+    async def async_call(self, method, kwargs, bucket=None, units=1.0, recorder=None):
+        """Async version of call"""
+        delays = self.delays()
+        attempt = 1
+        while True:
+            if bucket is not None:
+                await bucket.async_acquire(units)
+            try:
+                response = await method(**kwargs)
+            except Exception as e:
+                if bucket is not None and is_throttling_error(e):
+                    bucket.throttled()
+                if attempt >= self.max_attempts or not self.is_retryable(e):
+                    raise
+                attempt += 1
+                if recorder is not None:
+                    recorder.add(retries=1)
+                await asyncio.sleep(next(delays))
+                continue
+            if bucket is not None:
+                bucket.consumed(units, consumed_capacity_units(response))
+            return response
+
+
+class HedgePolicy:
+    """Send a second, identical read when the first one is slow
+
+    The hedge fires after ``delay`` seconds, or, when no fixed delay is
+    given, after the ``percentile`` latency of the last ``window`` reads.
+    Whichever response arrives first is used.
+
+    :param delay: fixed hedge delay in seconds
+    :param percentile: latency percentile used when delay is None
+    :param window: number of recent latencies kept
+    :param min_samples: latencies needed before the percentile is trusted
+    :param initial_delay: delay used until min_samples latencies are known
+    :param max_workers: threads used for hedged reads by sync tables
+    """
+
+    def __init__(
+        self,
+        delay=None,
+        percentile=0.95,
+        window=200,
+        min_samples=20,
+        initial_delay=0.05,
+        max_workers=8,
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.max_workers = max_workers
+        self.latencies = deque(maxlen=window)
+        self.hedged = 0
+        self.lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def current_delay(self):
+        if self.delay is not None:
+            return self.delay
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        return latencies[index]
+
+    def record(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def call(self, method, kwargs):
+        """Call a thread-safe method(**kwargs) with a hedged second request"""
+        start = time.perf_counter()
+        first = self.executor.submit(method, **kwargs)
+        try:
+            response = first.result(timeout=self.current_delay())
+            self.record(time.perf_counter() - start)
+            return response
+        except FutureTimeoutError:
+            pass
+
+        with self.lock:
+            self.hedged += 1
+        pending = {first, self.executor.submit(method, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self.record(time.perf_counter() - start)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def async_call(self, method, kwargs):
+        """Async version of call"""
+        start = time.perf_counter()
+        first = asyncio.ensure_future(method(**kwargs))
+        try:
+            response = await asyncio.wait_for(
+                asyncio.shield(first), self.current_delay()
+            )
+            self.record(time.perf_counter() - start)
+            return response
+        except asyncio.TimeoutError:
+            pass
+
+        with self.lock:
+            self.hedged += 1
+        pending = {first, asyncio.ensure_future(method(**kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is None:
+                        self.record(time.perf_counter() - start)
+                        return future.result()
+                    error = error or future.exception()
+        finally:
+            for other in pending:
+                other.cancel()
+        raise error
@@ -1,11 +1,18 @@
+import os
 import boto3
 from botocore.exceptions import ClientError
+from .metrics import Instrumentation
+
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
 
 
 class S3Bucket:
-    def __init__(self, bucket_name: str):
+    def __init__(self, bucket_name: str, metrics=None):
         self.bucket_name = bucket_name
         self.s3_client = boto3.client("s3")
+        self.instrumentation = Instrumentation(bucket_name, metrics)
 
     def upload_file(self, file_name: str, object_name=None, ExtraArgs=None):
         """Upload a file to an S3 bucket
@@ -20,9 +27,12 @@ class S3Bucket:
             object_name = file_name
 
         try:
-            _ = self.s3_client.upload_file(
-                file_name, self.bucket_name, object_name, ExtraArgs=ExtraArgs
-            )
+            with self.instrumentation.record("upload_file") as recorder:
+                _ = self.s3_client.upload_file(
+                    file_name, self.bucket_name, object_name, ExtraArgs=ExtraArgs
+                )
+                if self.instrumentation.enabled:
+                    recorder.add(items=1, bytes=os.path.getsize(file_name))
         except ClientError:
             return False
         return True
@@ -41,9 +51,12 @@ class S3Bucket:
 
         # Download the file
         try:
-            response = self.s3_client.download_file(
-                self.bucket_name, object_name, file_name
-            )
+            with self.instrumentation.record("download_file") as recorder:
+                response = self.s3_client.download_file(
+                    self.bucket_name, object_name, file_name
+                )
+                if self.instrumentation.enabled:
+                    recorder.add(items=1, bytes=os.path.getsize(file_name))
         except ClientError:
             return None
         return response
@@ -62,9 +75,11 @@ class S3Bucket:
 
         # Download the file
         try:
-            _ = self.s3_client.download_fileobj(
-                self.bucket_name, object_name, file_name
-            )
+            with self.instrumentation.record("download_fileobj") as recorder:
+                _ = self.s3_client.download_fileobj(
+                    self.bucket_name, object_name, file_name
+                )
+                recorder.add(items=1)
         except ClientError:
             return False
         return True
@@ -102,3 +117,144 @@ class S3Bucket:
             Conditions=Conditions,
         )
         return response
+
+    def put_object(self, object_name, data, ExtraArgs=None):
+        """Upload bytes as an S3 object
+
+        :param object_name: S3 object name
+        :param data: bytes
+        :return: boto3 response
+        """
+        with self.instrumentation.record("put_object") as recorder:
+            response = self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=object_name, Body=data, **(ExtraArgs or {})
+            )
+            recorder.add(items=1, bytes=len(data))
+        return response
+
+    def get_object(self, object_name):
+        """Read a whole S3 object
+
+        :param object_name: S3 object name
+        :return: bytes
+        """
+        with self.instrumentation.record("get_object") as recorder:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=object_name
+            )
+            recorder.page(response, 1)
+            body = response["Body"]
+            try:
+                return body.read()
+            finally:
+                body.close()
+
+    def delete_object(self, key, bucket_name=None):
+        with self.instrumentation.record("delete_object") as recorder:
+            response = self.s3_client.delete_object(
+                Bucket=bucket_name or self.bucket_name, Key=key
+            )
+            recorder.page(response, 1)
+        return response
+
+    def upload_stream(
+        self, object_name, chunks, part_size=MULTIPART_PART_SIZE, ExtraArgs=None
+    ):
+        """Upload an iterable of bytes chunks without holding it all in memory
+
+        Chunks are buffered up to part_size and sent as multipart upload parts,
+        so memory stays bounded by part_size. Streams smaller than one part
+        are sent with a single PutObject. Failed uploads are aborted.
+
+        :param object_name: S3 object name
+        :param chunks: iterable of bytes
+        :param part_size: multipart part size in bytes, at least 5MB
+        :return: number of bytes uploaded
+        """
+        if part_size < MULTIPART_MIN_PART_SIZE:
+            raise ValueError("part_size must be at least 5MB")
+
+        extra_args = ExtraArgs or {}
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        size = 0
+        with self.instrumentation.record("upload_stream") as recorder:
+            try:
+                for chunk in chunks:
+                    buffer += chunk
+                    if len(buffer) < part_size:
+                        continue
+                    if upload_id is None:
+                        upload_id = self.s3_client.create_multipart_upload(
+                            Bucket=self.bucket_name, Key=object_name, **extra_args
+                        )["UploadId"]
+                    parts.append(
+                        self._upload_part(
+                            object_name, upload_id, len(parts) + 1, buffer
+                        )
+                    )
+                    size += len(buffer)
+                    buffer = bytearray()
+
+                size += len(buffer)
+                if upload_id is None:
+                    self.s3_client.put_object(
+                        Bucket=self.bucket_name,
+                        Key=object_name,
+                        Body=bytes(buffer),
+                        **extra_args,
+                    )
+                else:
+                    if buffer:
+                        parts.append(
+                            self._upload_part(
+                                object_name, upload_id, len(parts) + 1, buffer
+                            )
+                        )
+                    self.s3_client.complete_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=object_name,
+                        UploadId=upload_id,
+                        MultipartUpload={"Parts": parts},
+                    )
+            except Exception:
+                if upload_id is not None:
+                    self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=object_name, UploadId=upload_id
+                    )
+                raise
+            recorder.add(items=1, bytes=size)
+        return size
+
+    def _upload_part(self, object_name, upload_id, part_number, data):
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=object_name,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=bytes(data),
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def iter_object(self, object_name, start_byte=0, chunk_size=READ_CHUNK_SIZE):
+        """Stream an object body as bytes chunks, without downloading it to disk
+
+        :param object_name: S3 object name
+        :param start_byte: offset to start reading from
+        :param chunk_size: size of the yielded chunks
+        :return: generator of bytes
+        """
+        kwargs = {"Bucket": self.bucket_name, "Key": object_name}
+        if start_byte:
+            kwargs["Range"] = f"bytes={start_byte}-"
+
+        with self.instrumentation.record("iter_object") as recorder:
+            response = self.s3_client.get_object(**kwargs)
+            recorder.page(response, 1)
+            body = response["Body"]
+            try:
+                for chunk in body.iter_chunks(chunk_size):
+                    yield chunk
+            finally:
+                body.close()
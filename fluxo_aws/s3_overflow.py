@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from .attribute_compression import _compression_encoder, _decode
+
+POINTER = "__s3_pointer__"
+DEFAULT_THRESHOLD = 64 * 1024
+
+
+def _encode(value):
+    return json.dumps(value, default=_compression_encoder).encode()
+
+
+def _run(function, arguments, max_workers):
+    """:return: list [function(x) for x in arguments], run in threads"""
+    if len(arguments) <= 1:
+        return [function(x) for x in arguments]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(arguments))) as executor:
+        return list(executor.map(function, arguments))
+
+
+class S3Overflow:
+    """Move large item attributes to S3, keeping a pointer in the item
+
+    Attributes whose JSON encoding is at least ``threshold`` bytes are
+    uploaded to "<prefix>/<item key digest>/<content sha256>" and replaced
+    by {"__s3_pointer__": {"key": ..., "size": ..., "sha256": ...}}. Reads
+    resolve pointers back to values, all objects of a page in parallel,
+    unless resolve_pointers is False; resolve(item) does it on demand.
+
+    Objects are removed when their item is deleted, or when update replaces
+    the attribute. add and batch_add don't look at the item they overwrite,
+    so its objects with a different content are left behind.
+
+    :param bucket: S3Bucket
+    :param threshold: attribute size in bytes from which it goes to S3
+    :param prefix: object name prefix
+    :param key_attributes: primary key attribute names, defaults to the
+        table hash_key and partition_key
+    :param resolve_pointers: resolve pointers on every read
+    :param max_workers: parallel S3 requests
+    """
+
+    def __init__(
+        self,
+        bucket,
+        threshold=DEFAULT_THRESHOLD,
+        prefix="dynamodb-overflow",
+        key_attributes=None,
+        resolve_pointers=True,
+        max_workers=8,
+    ):
+        self.bucket = bucket
+        self.threshold = threshold
+        self.prefix = prefix.rstrip("/")
+        self.key_attributes = key_attributes
+        self.resolve_pointers = resolve_pointers
+        self.max_workers = max_workers
+
+    @staticmethod
+    def is_pointer(value):
+        return isinstance(value, dict) and len(value) == 1 and POINTER in value
+
+    def object_names(self, item):
+        """:return: set of the object names the item points to"""
+        return {v[POINTER]["key"] for v in item.values() if self.is_pointer(v)}
+
+    def _plan(self, item, key_attributes):
+        """:return: (item with pointers, list [(object_name, data)] to upload)"""
+        key_attributes = self.key_attributes or key_attributes
+        if not key_attributes:
+            raise ValueError("S3Overflow needs the table hash_key or key_attributes")
+
+        result = {}
+        uploads = []
+        item_digest = None
+        for name, value in item.items():
+            if name in key_attributes or self.is_pointer(value):
+                result[name] = value
+                continue
+            data = _encode(value)
+            if len(data) < self.threshold:
+                result[name] = value
+                continue
+            if item_digest is None:
+                key = _encode([item.get(x) for x in key_attributes])
+                item_digest = hashlib.sha256(key).hexdigest()
+            digest = hashlib.sha256(data).hexdigest()
+            object_name = f"{self.prefix}/{item_digest}/{digest}"
+            uploads.append((object_name, data))
+            result[name] = {
+                POINTER: {"key": object_name, "size": len(data), "sha256": digest}
+            }
+        return result, uploads
+
+    def _pointers(self, items):
+        """:return: list [(item, attribute name, object name)]"""
+        return [
+            (item, name, value[POINTER]["key"])
+            for item in items
+            for name, value in item.items()
+            if self.is_pointer(value)
+        ]
+
+    def offload_items(self, items, key_attributes=()):
+        """Upload the large attributes of items
+
+        :return: list of the items with pointers instead of large attributes
+        """
+        plans = [self._plan(x, key_attributes) for x in items]
+        uploads = [upload for _, x in plans for upload in x]
+        _run(lambda x: self.bucket.put_object(*x), uploads, self.max_workers)
+        return [item for item, _ in plans]
+
+    def resolve_items(self, items, native_numbers=False):
+        """Replace pointers with their values, in place
+
+        :param native_numbers: numbers as int/float instead of Decimal
+        :return: items
+        """
+        pointers = self._pointers(items)
+        values = _run(
+            lambda x: _decode(self.bucket.get_object(x[2]), native_numbers),
+            pointers,
+            self.max_workers,
+        )
+        for (item, name, _), value in zip(pointers, values):
+            item[name] = value
+        return items
+
+    def resolve(self, item, native_numbers=False):
+        return self.resolve_items([item], native_numbers)[0]
+
+    def delete_objects(self, object_names):
+        _run(self.bucket.delete_object, list(object_names), self.max_workers)
+
+
+class AsyncS3Overflow(S3Overflow):
+    """Async version of S3Overflow, S3 requests run as concurrent tasks
+
+    :param bucket: entered AsyncS3Bucket
+    """
+
+    async def _gather(self, coroutines):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(run(x) for x in coroutines))
+
+    async def offload_items(self, items, key_attributes=()):
+        plans = [self._plan(x, key_attributes) for x in items]
+        await self._gather(
+            self.bucket.put_object(*upload) for _, x in plans for upload in x
+        )
+        return [item for item, _ in plans]
+
+    async def resolve_items(self, items, native_numbers=False):
+        pointers = self._pointers(items)
+        data = await self._gather(self.bucket.get_object(x[2]) for x in pointers)
+        for (item, name, _), value in zip(pointers, data):
+            item[name] = _decode(value, native_numbers)
+        return items
+
+    async def resolve(self, item, native_numbers=False):
+        return (await self.resolve_items([item], native_numbers))[0]
+
+    async def delete_objects(self, object_names):
+        await self._gather(self.bucket.delete_object(x) for x in object_names)
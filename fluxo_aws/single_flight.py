@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+
+def freeze(value):
+    """Turn request arguments into a hashable key"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze(x) for x in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(freeze(x) for x in value)
+    return value
+
+
+class _Stats:
+    def __init__(self):
+        self.operations = {}
+
+    def count(self, operation, coalesced):
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = {"calls": 0, "coalesced": 0}
+        stats["calls"] += 1
+        if coalesced:
+            stats["coalesced"] += 1
+
+    def copy(self):
+        return {k: dict(v) for k, v in self.operations.items()}
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Share one in-flight request between threads asking for the same thing
+
+    Callers that ask for a key while a request for it is running wait for
+    that request and receive the same result object (or exception), so
+    results must be treated as read-only.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self._stats = _Stats()
+
+    def do(self, operation, key, func):
+        """Run func(), unless an identical call is already in flight
+
+        :param operation: operation name, used in stats
+        :param key: hashable request arguments, including the table name when
+            the instance is shared between tables, see freeze
+        :param func: callable doing the request
+        """
+        key = (operation, key)
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _Call()
+            self._stats.count(operation, not leader)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            call.event.set()
+
+    def stats(self):
+        """:return: dict object {"<operation>": {"calls": <int>, "coalesced": <int>}}"""
+        with self.lock:
+            return self._stats.copy()
+
+
+class AsyncSingleFlight:
+    """Share one in-flight request between coroutines asking for the same thing
+
+    Async version of SingleFlight. A caller being cancelled does not cancel
+    the shared request.
+    """
+
+    def __init__(self):
+        self.inflight = {}
+        self._stats = _Stats()
+
+    async def do(self, operation, key, func):
+        """Await func(), unless an identical call is already in flight
+
+        :param operation: operation name, used in stats
+        :param key: hashable request arguments, including the table name when
+            the instance is shared between tables, see freeze
+        :param func: coroutine function doing the request
+        """
+        key = (operation, key)
+        task = self.inflight.get(key)
+        self._stats.count(operation, task is not None)
+        if task is None:
+            task = self.inflight[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """:return: dict object {"<operation>": {"calls": <int>, "coalesced": <int>}}"""
+        return self._stats.copy()
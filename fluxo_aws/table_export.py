@@ -0,0 +1,139 @@
+import asyncio
+import json
+import zlib
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from boto3.dynamodb.types import Binary
+from .json_encoder import json_encoder
+from .s3_bucket import MULTIPART_PART_SIZE
+
+
+def export_encoder(obj):
+    """json_encoder that keeps integer numbers as int and handles sets and Binary"""
+    if isinstance(obj, Decimal) and obj == obj.to_integral_value():
+        return int(obj)
+    elif isinstance(obj, (set, frozenset)):
+        return list(obj)
+    elif isinstance(obj, Binary):
+        obj = obj.value
+    if isinstance(obj, bytes):
+        return b64encode(obj).decode()
+    return json_encoder(obj)
+
+
+def _object_name(prefix, segment, compress):
+    extension = "ndjson.gz" if compress else "ndjson"
+    return f"{prefix}part-{segment:05d}.{extension}"
+
+
+class _NDJSONEncoder:
+    """Turn pages of items into (optionally gzip compressed) NDJSON bytes"""
+
+    def __init__(self, compress, compression_level):
+        self.items = 0
+        self.compressor = None
+        if compress:
+            # wbits 31 writes a gzip header and trailer
+            self.compressor = zlib.compressobj(compression_level, zlib.DEFLATED, 31)
+
+    def encode(self, items):
+        self.items += len(items)
+        data = "".join(
+            json.dumps(item, default=export_encoder) + "\n" for item in items
+        ).encode()
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        return data
+
+    def flush(self):
+        if self.compressor is not None:
+            return self.compressor.flush()
+        return b""
+
+
+def export_table(
+    table,
+    bucket,
+    prefix="",
+    segments=1,
+    compress=True,
+    compression_level=6,
+    part_size=MULTIPART_PART_SIZE,
+):
+    """Stream a DynamodbTable scan into S3 as NDJSON objects
+
+    Items are scanned page by page and written through multipart uploads, so
+    memory stays bounded by part_size per segment. Each parallel scan
+    segment runs in its own thread and writes its own object,
+    "<prefix>part-00000.ndjson.gz", "<prefix>part-00001.ndjson.gz", ...
+
+    :param table: DynamodbTable
+    :param bucket: S3Bucket
+    :param prefix: object name prefix, e.g. "exports/2020-01-01/"
+    :param segments: number of parallel scan segments
+    :param compress: gzip the objects
+    :param compression_level: gzip level, 1-9
+    :param part_size: multipart upload part size in bytes
+    :return: list [{"object_name": ..., "items": ..., "bytes": ...}]
+    """
+
+    def export_segment(segment):
+        encoder = _NDJSONEncoder(compress, compression_level)
+
+        def chunks():
+            pages = table.scan_pages(segment, segments if segments > 1 else None)
+            for items in pages:
+                data = encoder.encode(items)
+                if data:
+                    yield data
+            yield encoder.flush()
+
+        object_name = _object_name(prefix, segment, compress)
+        size = bucket.upload_stream(object_name, chunks(), part_size=part_size)
+        return {"object_name": object_name, "items": encoder.items, "bytes": size}
+
+    if segments == 1:
+        return [export_segment(0)]
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        return list(executor.map(export_segment, range(segments)))
+
+
+async def async_export_table(
+    table,
+    bucket,
+    prefix="",
+    segments=1,
+    compress=True,
+    compression_level=6,
+    part_size=MULTIPART_PART_SIZE,
+):
+    """Stream an AsyncDynamodbTable scan into S3 as NDJSON objects
+
+    Async version of export_table: parallel scan segments run as concurrent
+    tasks instead of threads.
+
+    :param table: AsyncDynamodbTable
+    :param bucket: AsyncS3Bucket
+    :return: list [{"object_name": ..., "items": ..., "bytes": ...}]
+    """
+
+    async def export_segment(segment):
+        encoder = _NDJSONEncoder(compress, compression_level)
+
+        async def chunks():
+            pages = table.scan_pages(segment, segments if segments > 1 else None)
+            async for items in pages:
+                data = encoder.encode(items)
+                if data:
+                    yield data
+            yield encoder.flush()
+
+        object_name = _object_name(prefix, segment, compress)
+        size = await bucket.upload_stream(object_name, chunks(), part_size=part_size)
+        return {"object_name": object_name, "items": encoder.items, "bytes": size}
+
+    return list(
+        await asyncio.gather(*(export_segment(segment) for segment in range(segments)))
+    )
@@ -0,0 +1,288 @@
+import asyncio
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CONCURRENCY = 4
+
+
+class _LineSplitter:
+    """Split a stream of bytes chunks into lines, tracking byte offsets"""
+
+    def __init__(self, offset):
+        self.offset = offset
+        self.buffer = b""
+
+    def feed(self, chunk):
+        """:return: list [(line, offset right after the line)]"""
+        lines = (self.buffer + chunk).split(b"\n")
+        self.buffer = lines.pop()
+        result = []
+        for line in lines:
+            self.offset += len(line) + 1
+            result.append((line, self.offset))
+        return result
+
+    def finish(self):
+        if not self.buffer:
+            return []
+        self.offset += len(self.buffer)
+        line, self.buffer = self.buffer, b""
+        return [(line, self.offset)]
+
+
+class _RecordParser:
+    def __init__(self, format, fieldnames, transform):
+        if format not in ("ndjson", "csv"):
+            raise ValueError("format must be ndjson or csv")
+        self.format = format
+        self.fieldnames = fieldnames
+        self.transform = transform
+
+    def parse(self, line):
+        """:return: record dict, or None for blank and header lines"""
+        line = line.rstrip(b"\r")
+        if not line.strip():
+            return None
+        if self.format == "ndjson":
+            record = json.loads(line, parse_float=Decimal)
+        else:
+            row = next(csv.reader([line.decode()]))
+            if self.fieldnames is None:
+                self.fieldnames = row
+                return None
+            record = dict(zip(self.fieldnames, row))
+        if self.transform is not None:
+            record = self.transform(record)
+        return record
+
+
+class _Progress:
+    def __init__(self, offset, checkpoint, time_limit):
+        self.offset = offset
+        self.items = 0
+        self.checkpoint = checkpoint
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+
+    def commit(self, offset, items):
+        self.offset = offset
+        self.items += items
+        if self.checkpoint is not None:
+            self.checkpoint(offset)
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def result(self, done):
+        return {"offset": self.offset, "items": self.items, "done": done}
+
+
+def _is_invalid_range(error):
+    return error.response.get("Error", {}).get("Code") == "InvalidRange"
+
+
+def _read_header(chunks):
+    splitter = _LineSplitter(0)
+    for chunk in chunks:
+        lines = splitter.feed(chunk)
+        if lines:
+            return next(csv.reader([lines[0][0].rstrip(b"\r").decode()]))
+    lines = splitter.finish()
+    return next(csv.reader([lines[0][0].decode()])) if lines else []
+
+
+def import_table(
+    table,
+    bucket,
+    object_name,
+    format="ndjson",
+    start_offset=0,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    concurrency=DEFAULT_CONCURRENCY,
+    checkpoint=None,
+    time_limit=None,
+    fieldnames=None,
+    transform=None,
+):
+    """Stream an NDJSON or CSV object from S3 into a DynamodbTable
+
+    The object is read as a stream and parsed line by line. Records are
+    validated with the table schema chunk_size at a time, and up to
+    concurrency chunks are written in parallel with BatchWriteItem. After
+    every such wave the byte offset right after the last written record is
+    reported to checkpoint, so an interrupted import can resume from it.
+
+    CSV objects must have a header line (unless fieldnames is given) and no
+    line breaks inside quoted values; CSV values are imported as strings.
+
+    :param table: DynamodbTable
+    :param bucket: S3Bucket
+    :param object_name: S3 object name
+    :param format: "ndjson" or "csv"
+    :param start_offset: byte offset to resume from, as given to checkpoint
+    :param chunk_size: records validated and written per batch
+    :param concurrency: batches written in parallel
+    :param checkpoint: callable receiving the offset after each wave
+    :param time_limit: seconds after which the import stops at the next
+        checkpoint, e.g. to leave a lambda time to save the offset
+    :param fieldnames: CSV column names, when the object has no header line
+    :param transform: callable applied to every record before validation
+    :raise: SchemaError if a record does not match the table schema
+    :return: dict object {"offset": <int>, "items": <int>, "done": <bool>}
+    """
+    if format == "csv" and fieldnames is None and start_offset:
+        fieldnames = _read_header(bucket.iter_object(object_name))
+    parser = _RecordParser(format, fieldnames, transform)
+    progress = _Progress(start_offset, checkpoint, time_limit)
+    splitter = _LineSplitter(start_offset)
+    wave = []
+    chunk = []
+
+    def write_wave(executor):
+        offset = wave[-1][1]
+        chunks = [records for records, _ in wave]
+        list(executor.map(lambda x: table.batch_add(x, validate=False), chunks))
+        progress.commit(offset, sum(len(x) for x in chunks))
+        wave.clear()
+
+    def add_lines(lines, executor):
+        for line, offset in lines:
+            record = parser.parse(line)
+            if record is not None:
+                chunk.append(record)
+            if len(chunk) >= chunk_size:
+                table.validate_items(chunk)
+                wave.append((list(chunk), offset))
+                chunk.clear()
+            if len(wave) >= concurrency:
+                write_wave(executor)
+                if progress.expired():
+                    return False
+        return True
+
+    chunks = bucket.iter_object(object_name, start_offset)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for data in chunks:
+                if not add_lines(splitter.feed(data), executor):
+                    return progress.result(False)
+        except ClientError as e:
+            if not _is_invalid_range(e):
+                raise
+            # Resuming at the end of the object
+            return progress.result(True)
+        finally:
+            chunks.close()
+
+        if not add_lines(splitter.finish(), executor):
+            return progress.result(False)
+        if chunk:
+            table.validate_items(chunk)
+            wave.append((list(chunk), splitter.offset))
+        elif wave or splitter.offset != progress.offset:
+            # Trailing blank lines still move the offset forward
+            wave.append(([], splitter.offset))
+        if wave:
+            write_wave(executor)
+
+    return progress.result(True)
+
+
+async def _async_read_header(chunks):
+    splitter = _LineSplitter(0)
+    try:
+        async for chunk in chunks:
+            lines = splitter.feed(chunk)
+            if lines:
+                return next(csv.reader([lines[0][0].rstrip(b"\r").decode()]))
+    finally:
+        await chunks.aclose()
+    lines = splitter.finish()
+    return next(csv.reader([lines[0][0].decode()])) if lines else []
+
+
+async def async_import_table(
+    table,
+    bucket,
+    object_name,
+    format="ndjson",
+    start_offset=0,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    concurrency=DEFAULT_CONCURRENCY,
+    checkpoint=None,
+    time_limit=None,
+    fieldnames=None,
+    transform=None,
+):
+    """Stream an NDJSON or CSV object from S3 into an AsyncDynamodbTable
+
+    Async version of import_table: the batches of a wave are written as
+    concurrent tasks. checkpoint may be a plain or an async callable.
+
+    :param table: AsyncDynamodbTable
+    :param bucket: AsyncS3Bucket
+    :return: dict object {"offset": <int>, "items": <int>, "done": <bool>}
+    """
+    if format == "csv" and fieldnames is None and start_offset:
+        fieldnames = await _async_read_header(bucket.iter_object(object_name))
+    parser = _RecordParser(format, fieldnames, transform)
+    progress = _Progress(start_offset, None, time_limit)
+    splitter = _LineSplitter(start_offset)
+    wave = []
+    chunk = []
+
+    async def write_wave():
+        offset = wave[-1][1]
+        chunks = [records for records, _ in wave]
+        await asyncio.gather(*(table.batch_add(x, validate=False) for x in chunks))
+        progress.commit(offset, sum(len(x) for x in chunks))
+        wave.clear()
+        if checkpoint is not None:
+            result = checkpoint(offset)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def add_lines(lines):
+        for line, offset in lines:
+            record = parser.parse(line)
+            if record is not None:
+                chunk.append(record)
+            if len(chunk) >= chunk_size:
+                table.validate_items(chunk)
+                wave.append((list(chunk), offset))
+                chunk.clear()
+            if len(wave) >= concurrency:
+                await write_wave()
+                if progress.expired():
+                    return False
+        return True
+
+    chunks = bucket.iter_object(object_name, start_offset)
+    try:
+        async for data in chunks:
+            if not await add_lines(splitter.feed(data)):
+                return progress.result(False)
+    except ClientError as e:
+        if not _is_invalid_range(e):
+            raise
+        # Resuming at the end of the object
+        return progress.result(True)
+    finally:
+        await chunks.aclose()
+
+    if not await add_lines(splitter.finish()):
+        return progress.result(False)
+    if chunk:
+        table.validate_items(chunk)
+        wave.append((list(chunk), splitter.offset))
+    elif wave or splitter.offset != progress.offset:
+        # Trailing blank lines still move the offset forward
+        wave.append(([], splitter.offset))
+    if wave:
+        await write_wave()
+
+    return progress.result(True)
@@ -0,0 +1,359 @@
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sys import intern
+from .fast_deserializer import deserialize_item
+from .single_flight import SingleFlight, AsyncSingleFlight, freeze
+
+_RANGE_OPERATORS = {
+    "in": lambda value, data: value in data,
+    "between": lambda value, data: data[0] <= value <= data[1],
+    "le": lambda value, data: value <= data,
+    "eq": lambda value, data: value == data,
+    "ge": lambda value, data: value >= data,
+}
+
+
+class _Store:
+    """Items by primary key, plus hash indexes from value to primary keys"""
+
+    def __init__(self, key_attributes, indexes):
+        self.key_attributes = key_attributes
+        self.items = {}
+        self.indexes = {x: {} for x in indexes}
+
+    def key(self, item):
+        return tuple(freeze(item.get(x)) for x in self.key_attributes)
+
+    def put(self, item):
+        # Attribute names repeat in every item, keep a single copy of each
+        item = {intern(k): v for k, v in item.items()}
+        key = self.key(item)
+        self.remove(key)
+        self.items[key] = item
+        for attribute, index in self.indexes.items():
+            if attribute in item:
+                index.setdefault(freeze(item[attribute]), {})[key] = None
+
+    def remove(self, key):
+        item = self.items.pop(key, None)
+        if item is None:
+            return
+        for attribute, index in self.indexes.items():
+            if attribute in item:
+                value = freeze(item[attribute])
+                keys = index[value]
+                del keys[key]
+                if not keys:
+                    del index[value]
+
+    def find(self, attribute, value):
+        """:return: list of the items whose attribute equals value"""
+        index = self.indexes.get(attribute)
+        if index is not None:
+            return [self.items[k] for k in index.get(freeze(value), ())]
+        return [x for x in self.items.values() if x.get(attribute) == value]
+
+
+class _Snapshot:
+    """Local versions of the table reads, shared by both snapshot classes"""
+
+    def __init__(self, table, indexes, key_attributes, max_staleness, segments):
+        self.table = table
+        self.indexes = tuple(indexes)
+        self.key_attributes = key_attributes
+        self.max_staleness = max_staleness
+        self.segments = segments
+        self.loaded_at = None
+        self._store = None
+        # [(changes, rescan)] received while a load runs, None otherwise
+        self._pending = None
+
+    def is_stale(self):
+        if self.loaded_at is None:
+            return True
+        if self.max_staleness is None:
+            return False
+        return time.monotonic() - self.loaded_at > self.max_staleness
+
+    def _new_store(self):
+        indexes = set(self.indexes)
+        indexes.add(self.key_attributes[0])
+        if self.table.hash_key:
+            indexes.add(self.table.hash_key)
+        return _Store(self.key_attributes, indexes)
+
+    def _get_item(self, data):
+        item = self._store.items.get(self._store.key(data))
+        return dict(item) if item else {}
+
+    def _get_by_hash_key(self, id, hash_key=None):
+        key = hash_key or self.table.hash_key
+        return [dict(x) for x in self._store.find(key, id)]
+
+    def _query_items(self, data, key):
+        if not isinstance(key, dict):
+            items = self._store.find(key, data)
+            if key == self.key_attributes[0] and len(self.key_attributes) > 1:
+                items.sort(key=lambda x: x[self.key_attributes[1]])
+            return [dict(x) for x in items]
+
+        match = _RANGE_OPERATORS[key["operator"]]
+        items = [
+            x
+            for x in self._store.find(key["hash"], data["hash"])
+            if key["range"] in x and match(x[key["range"]], data["range"])
+        ]
+        items.sort(key=lambda x: x[key["range"]])
+        return [dict(x) for x in items]
+
+    def _get_all_filtered_items(self, data, key, operator):
+        if operator != "in":
+            return [dict(x) for x in self._store.items.values()]
+        items = {}
+        for value in data:
+            for x in self._store.find(key, value):
+                items[id(x)] = x
+        return [dict(x) for x in items.values()]
+
+    def _read_changes(self, records):
+        """:return: (list [(keys, new item or None when removed)], rescan)"""
+        changes = []
+        rescan = False
+        for record in records:
+            change = record.get("dynamodb", {})
+            if record.get("eventName") == "REMOVE":
+                changes.append((self._deserialize(change["Keys"]), None))
+            elif "NewImage" in change:
+                item = self._deserialize(change["NewImage"])
+                # Stream images hold attributes as stored, compressed or not
+                changes.append((item, self.table._decompress([item])[0]))
+            else:
+                # KEYS_ONLY streams don't carry the item, rescan on next read
+                rescan = True
+        return changes, rescan
+
+    def _apply_changes(self, changes, rescan):
+        if self._store is None and self._pending is None:
+            return 0
+        if self._pending is not None:
+            # The running scan may have read the items before these changes
+            self._pending.append((changes, rescan))
+        if self._store is not None:
+            self._apply(self._store, changes)
+        if rescan:
+            self.loaded_at = None
+        return len(changes)
+
+    @staticmethod
+    def _apply(store, changes):
+        for keys, item in changes:
+            if item is None:
+                store.remove(store.key(keys))
+            else:
+                store.put(item)
+
+    def _replace_store(self, store, loaded_at):
+        """Replay the changes received during the load, then swap store in"""
+        rescan = False
+        for changes, x in self._pending:
+            self._apply(store, changes)
+            rescan = rescan or x
+        self._store = store
+        self._pending = None
+        self.loaded_at = None if rescan else loaded_at
+
+    def _deserialize(self, image):
+        # Numbers as the table reads them, so stream items match scanned ones
+        return deserialize_item(image, self.table.native_numbers)
+
+
+class TableSnapshot(_Snapshot):
+    """In-memory copy of a small DynamodbTable, answering reads locally
+
+    The table is loaded with a scan, and every read after that is served
+    from memory. Items are indexed by primary key and by the table hash key;
+    the attributes in ``indexes`` get hash indexes too, any other attribute
+    is matched by going through every item.
+
+    A read finding the snapshot older than ``max_staleness`` seconds first
+    rescans the table. In between, apply_changes keeps it up to date from
+    DynamoDB Streams records. Reads return copies of the items, writes must
+    still go through the table.
+
+    :param table: DynamodbTable
+    :param indexes: attribute names to build hash indexes on
+    :param key_attributes: primary key attribute names, read from the table
+        key schema when not given
+    :param max_staleness: seconds between rescans, None to never rescan
+    :param segments: parallel scan segments used to load the table
+    """
+
+    def __init__(
+        self, table, indexes=(), key_attributes=None, max_staleness=None, segments=1
+    ):
+        super().__init__(table, indexes, key_attributes, max_staleness, segments)
+        self.lock = threading.Lock()
+        self._refresh_flight = SingleFlight()
+
+    def refresh(self):
+        """Rescan the table and replace the snapshot
+
+        Concurrent refreshes share a single scan.
+        """
+        self._refresh_flight.do("refresh", None, self._load)
+
+    def _load(self):
+        if self.key_attributes is None:
+            self.key_attributes = [
+                x["AttributeName"] for x in self.table.table.key_schema
+            ]
+        loaded_at = time.monotonic()
+        store = self._new_store()
+        total_segments = self.segments if self.segments > 1 else None
+
+        def scan_segment(segment):
+            for items in self.table.scan_pages(segment, total_segments):
+                with self.lock:
+                    for item in items:
+                        store.put(item)
+
+        with self.lock:
+            self._pending = []
+        try:
+            if self.segments > 1:
+                with ThreadPoolExecutor(max_workers=self.segments) as executor:
+                    list(executor.map(scan_segment, range(self.segments)))
+            else:
+                scan_segment(0)
+        except BaseException:
+            with self.lock:
+                self._pending = None
+            raise
+
+        with self.lock:
+            self._replace_store(store, loaded_at)
+
+    def _read(self, method, *args):
+        if self.is_stale():
+            self.refresh()
+        with self.lock:
+            return method(*args)
+
+    def get_item(self, data):
+        return self._read(self._get_item, data)
+
+    def get_by_hash_key(self, id, hash_key=None, index_name=None):
+        """Items whose hash_key attribute equals id
+
+        :param index_name: ignored, indexes are per attribute
+        """
+        return self._read(self._get_by_hash_key, id, hash_key)
+
+    def query_items(self, data, key, startKey=None, index_name=None):
+        """Query items, with the same data and key as DynamodbTable.query_items
+
+        :return: dict object {"Items": [...items...], "ExclusiveStartKey": None}
+        """
+        items = self._read(self._query_items, data, key)
+        return {"Items": items, "ExclusiveStartKey": None}
+
+    def get_all_filtered_items(self, data, key, operator="in"):
+        return self._read(self._get_all_filtered_items, data, key, operator)
+
+    def get_all(self):
+        return self._read(lambda: [dict(x) for x in self._store.items.values()])
+
+    def apply_changes(self, records):
+        """Apply DynamoDB Streams records, e.g. the Records of a stream event
+
+        Records need NEW_IMAGE or NEW_AND_OLD_IMAGES stream view types.
+        Ignored until the snapshot starts loading; records received during
+        a load or rescan are replayed onto the new copy before it is used.
+
+        :return: number of records applied
+        """
+        if self._store is None and self._pending is None:
+            return 0
+        changes, rescan = self._read_changes(records)
+        # Attributes moved to S3 are fetched like table reads do
+        self.table._load_overflow([item for _, item in changes if item])
+        with self.lock:
+            return self._apply_changes(changes, rescan)
+
+
+class AsyncTableSnapshot(_Snapshot):
+    """In-memory copy of a small AsyncDynamodbTable, answering reads locally
+
+    Async version of TableSnapshot: loading and rescans are awaited, the
+    local reads are coroutines for compatibility with the table methods.
+
+    :param table: entered AsyncDynamodbTable
+    """
+
+    def __init__(
+        self, table, indexes=(), key_attributes=None, max_staleness=None, segments=1
+    ):
+        super().__init__(table, indexes, key_attributes, max_staleness, segments)
+        self._refresh_flight = AsyncSingleFlight()
+
+    async def refresh(self):
+        """Rescan the table and replace the snapshot
+
+        Concurrent refreshes share a single scan.
+        """
+        await self._refresh_flight.do("refresh", None, self._load)
+
+    async def _load(self):
+        if self.key_attributes is None:
+            key_schema = self.table.table.key_schema
+            if inspect.isawaitable(key_schema):
+                key_schema = await key_schema
+            self.key_attributes = [x["AttributeName"] for x in key_schema]
+        loaded_at = time.monotonic()
+        store = self._new_store()
+        total_segments = self.segments if self.segments > 1 else None
+
+        async def scan_segment(segment):
+            async for items in self.table.scan_pages(segment, total_segments):
+                for item in items:
+                    store.put(item)
+
+        self._pending = []
+        try:
+            await asyncio.gather(*(scan_segment(x) for x in range(self.segments)))
+        except BaseException:
+            self._pending = None
+            raise
+        self._replace_store(store, loaded_at)
+
+    async def _read(self, method, *args):
+        if self.is_stale():
+            await self.refresh()
+        return method(*args)
+
+    async def get_item(self, data):
+        return await self._read(self._get_item, data)
+
+    async def get_by_hash_key(self, id, hash_key=None, index_name=None):
+        return await self._read(self._get_by_hash_key, id, hash_key)
+
+    async def query_items(self, data, key, startKey=None, index_name=None):
+        items = await self._read(self._query_items, data, key)
+        return {"Items": items, "ExclusiveStartKey": None}
+
+    async def get_all_filtered_items(self, data, key, operator="in"):
+        return await self._read(self._get_all_filtered_items, data, key, operator)
+
+    async def get_all(self):
+        return await self._read(lambda: [dict(x) for x in self._store.items.values()])
+
+    async def apply_changes(self, records):
+        """Apply DynamoDB Streams records, see TableSnapshot.apply_changes"""
+        if self._store is None and self._pending is None:
+            return 0
+        changes, rescan = self._read_changes(records)
+        await self.table._load_overflow([item for _, item in changes if item])
+        return self._apply_changes(changes, rescan)
@@ -0,0 +1,204 @@
+import asyncio
+import inspect
+from .dynamodb_table import BATCH_WRITE_SIZE
+
+
+class UnprocessedWriteError(Exception):
+    pass
+
+
+class _PendingWrite:
+    __slots__ = ("key", "request", "future")
+
+    def __init__(self, key, request, future):
+        self.key = key
+        self.request = request
+        self.future = future
+
+
+class AsyncWriteCoalescer:
+    """Coalesce concurrent AsyncDynamodbTable writes into BatchWriteItem calls
+
+    add and delete calls arriving within ``window`` seconds (or until
+    ``max_batch_size`` writes are waiting) are sent as one BatchWriteItem.
+    Every caller awaits its own write and gets its own result or error.
+    Two writes to the same key never share a batch: the second one starts a
+    new batch, which is only sent after the first one completes.
+
+    Usage::
+
+        async with AsyncWriteCoalescer(table) as writer:
+            await asyncio.gather(*(writer.add(item) for item in items))
+
+    :param table: entered AsyncDynamodbTable
+    :param window: seconds to wait for more writes before sending a batch
+    :param max_batch_size: writes per batch, at most 25
+    :param key_attributes: primary key attribute names, read from the table
+        key schema when not given
+    :param max_unprocessed_retries: times UnprocessedItems are resent before
+        their callers get an UnprocessedWriteError
+    """
+
+    def __init__(
+        self,
+        table,
+        window=0.01,
+        max_batch_size=BATCH_WRITE_SIZE,
+        key_attributes=None,
+        max_unprocessed_retries=5,
+    ):
+        self.table = table
+        self.window = window
+        self.max_batch_size = min(max_batch_size, BATCH_WRITE_SIZE)
+        self.key_attributes = key_attributes
+        self.max_unprocessed_retries = max_unprocessed_retries
+        self._batch = []
+        self._batch_keys = set()
+        self._timer = None
+        self._inflight = {}
+        self._tasks = set()
+
+    async def __aenter__(self):
+        await self._resolve_key_attributes()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
+
+    async def _resolve_key_attributes(self):
+        if self.key_attributes is None:
+            key_schema = self.table.table.key_schema
+            if inspect.isawaitable(key_schema):
+                key_schema = await key_schema
+            self.key_attributes = [x["AttributeName"] for x in key_schema]
+        return self.key_attributes
+
+    async def add(self, data):
+        """Put an item, validated with the table schema
+
+        :raise: SchemaError if the item does not match the table schema
+        """
+        self.table.validate_items([data])
+        (data,) = await self.table._offload([data])
+        item = self.table._serialize(data)
+        await self._resolve_key_attributes()
+        key = tuple(item.get(x) for x in self.key_attributes)
+        return await self._enqueue(key, {"PutRequest": {"Item": item}})
+
+    async def delete(self, key: dict):
+        """Delete an item, and its S3 objects when the table has overflow set"""
+        await self._resolve_key_attributes()
+        overflow = self.table.overflow
+        object_names = set()
+        if overflow is not None:
+            item = await self.table._get_item(key, resolve=False)
+            object_names = overflow.object_names(item)
+
+        key_values = tuple(key.get(x) for x in self.key_attributes)
+        result = await self._enqueue(key_values, {"DeleteRequest": {"Key": key}})
+        # Only once the item is gone, its objects are no longer referenced
+        if object_names:
+            await overflow.delete_objects(object_names)
+        return result
+
+    async def flush(self):
+        """Send the current batch and wait for every batch in flight"""
+        self._send_batch()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def _enqueue(self, key, request):
+        if key in self._batch_keys:
+            self._send_batch()
+
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append(_PendingWrite(key, request, future))
+        self._batch_keys.add(key)
+        if len(self._batch) >= self.max_batch_size:
+            self._send_batch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.window, self._send_batch
+            )
+        return future
+
+    def _send_batch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+
+        batch, self._batch, self._batch_keys = self._batch, [], set()
+        # Writes to the same key must reach DynamoDB in call order
+        previous = {self._inflight[x.key] for x in batch if x.key in self._inflight}
+        task = asyncio.ensure_future(self._write(batch, previous))
+        for x in batch:
+            self._inflight[x.key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._done(t, batch))
+
+    def _done(self, task, batch):
+        self._tasks.discard(task)
+        for x in batch:
+            if self._inflight.get(x.key) is task:
+                del self._inflight[x.key]
+
+    async def _write(self, batch, previous):
+        table = self.table
+        client = table.table.meta.client
+        pending = batch
+        attempt = 0
+        try:
+            if previous:
+                await asyncio.gather(*previous, return_exceptions=True)
+            with table.instrumentation.record("coalesced_write") as recorder:
+                while pending:
+                    response = await table._call(
+                        "write",
+                        float(len(pending)),
+                        client.batch_write_item,
+                        {
+                            "RequestItems": {
+                                table.table_name: [x.request for x in pending]
+                            }
+                        },
+                        recorder,
+                    )
+                    unprocessed = response.get("UnprocessedItems", {}).get(
+                        table.table_name, []
+                    )
+                    unprocessed_keys = {self._request_key(x) for x in unprocessed}
+                    retry = []
+                    for x in pending:
+                        if x.key in unprocessed_keys:
+                            retry.append(x)
+                        elif not x.future.done():
+                            x.future.set_result(True)
+                    recorder.page(response, len(pending) - len(retry))
+
+                    pending = retry
+                    if pending:
+                        if attempt >= self.max_unprocessed_retries:
+                            raise UnprocessedWriteError(
+                                "DynamoDB left the write unprocessed"
+                            )
+                        await asyncio.sleep(min(0.05 * 2 ** attempt, 1.0))
+                        attempt += 1
+        except Exception as e:
+            for x in pending:
+                if not x.future.done():
+                    x.future.set_exception(e)
+        except BaseException:
+            # Cancelled, e.g. by the loop closing: don't leave callers waiting
+            for x in pending:
+                if not x.future.done():
+                    x.future.cancel()
+            raise
+
+    def _request_key(self, request):
+        if "PutRequest" in request:
+            values = request["PutRequest"]["Item"]
+        else:
+            values = request["DeleteRequest"]["Key"]
+        return tuple(values.get(x) for x in self.key_attributes)